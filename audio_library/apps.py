@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class AudioLibraryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "audio_library"
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from audio_library import signals  # noqa: F401
+        from audio_library.services.search import install_search_index
+
+        post_migrate.connect(install_search_index, sender=self)
@@ -1,4 +1,18 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import hashlib
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from audio_library.services.list_cache import get_generations, get_last_modified
 
 
 class MixedSerializer:
@@ -11,6 +25,176 @@ class MixedSerializer:
         return serializer_class(*args, **kwargs)
 
 
+class KeysetPagination(BasePagination):
+    """
+    Newest-first pages that continue after the `(created_at, id)` of the last
+    row of the previous page, handed out as an opaque cursor. Every page is an
+    index range scan however deep it is, and rows inserted meanwhile don't
+    shift it. Without a `cursor` parameter the list isn't paginated.
+    """
+
+    page_size = 20
+    cursor_query_param = "cursor"
+    ordering = ("-created_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def decode_cursor(self, cursor: str):
+        try:
+            created_at, pk = (
+                base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            )
+            return datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row) -> str:
+        position = f"{row.created_at.isoformat()}|{row.pk}"
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return None
+        self.request = request
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+        rows = list(queryset[: self.page_size + 1])
+        self.next_row = rows[self.page_size - 1] if len(rows) > self.page_size else None
+        return rows[: self.page_size]
+
+    def get_next_link(self):
+        if self.next_row is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_row),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+
+class FeedPagination(KeysetPagination):
+    """
+    KeysetPagination over a Feed, which merges its sources itself. The first
+    page doesn't need a cursor.
+    """
+
+    def paginate_queryset(self, feed, request, view=None):
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        position = self.decode_cursor(cursor) if cursor else None
+        rows = feed.page(position, self.page_size + 1)
+        self.next_row = rows[self.page_size - 1] if len(rows) > self.page_size else None
+        return rows[: self.page_size]
+
+
 class Pagination(PageNumberPagination):
+    """
+    Page numbers in `page`, `page_size` is still read as the page number for
+    older clients. A `cursor` parameter switches to KeysetPagination.
+    """
+
     page_size = 20
-    page_query_param = "page_size"
+    page_query_param = "page"
+    legacy_page_query_param = "page_size"
+    query_params = ("page", "page_size", KeysetPagination.cursor_query_param)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_page_number(self, request, paginator):
+        page_number = request.query_params.get(
+            self.page_query_param
+        ) or request.query_params.get(self.legacy_page_query_param, 1)
+        if page_number in self.last_page_strings:
+            page_number = paginator.num_pages
+        return page_number
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class SearchPagination(PageNumberPagination):
+    page_size = 20
+
+
+class ScopedListMixin:
+    """
+    A list whose output only changes when a generation of one of its
+    `get_cache_scopes()` is bumped, see audio_library.signals.
+    """
+
+    def get_cache_scopes(self) -> list:
+        raise NotImplementedError
+
+
+class ConditionalListMixin(ScopedListMixin):
+    """
+    Answers conditional GETs of a list endpoint from the generations of its
+    cache scopes, returning 304 before the queryset is touched. The ETag
+    covers the full URL and the generations, Last-Modified is the latest
+    bump of a scope.
+    """
+
+    def list(self, request, *args, **kwargs):
+        scopes = self.get_cache_scopes()
+        etag = quote_etag(
+            hashlib.md5(
+                f"{request.get_full_path()}|{get_generations(*scopes)}".encode()
+            ).hexdigest()
+        )
+        last_modified = get_last_modified(*scopes)
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            return response
+        response = super().list(request, *args, **kwargs)
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
+
+
+class CachedListMixin(ScopedListMixin):
+    """
+    Caches list responses by their filterset and page parameters together
+    with the generations of `get_cache_scopes()`. Signals bump a generation on
+    every change that can alter the output, so stale entries are never hit.
+    """
+
+    def get_cache_key(self, request) -> str:
+        params = sorted(
+            (key, value)
+            for key in (*self.filterset_fields, *self.paginator.query_params)
+            for value in request.query_params.getlist(key)
+        )
+        generations = get_generations(*self.get_cache_scopes())
+        digest = hashlib.md5(
+            repr(
+                (request.build_absolute_uri(request.path), params, generations)
+            ).encode()
+        ).hexdigest()
+        return f"list_cache:response:{digest}"
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        cache.set(key, response.data, settings.LIST_CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from audio_library.services.similarity import build_similar_tracks
+
+
+class Command(BaseCommand):
+    help = "Rebuild similar tracks from playlist and like co-occurrence"
+
+    def handle(self, *args, **options):
+        count = build_similar_tracks()
+        self.stdout.write(f"Stored {count} similar tracks")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from audio_library.services.listening import compact_listening_events
+
+
+class Command(BaseCommand):
+    help = "Compact listening events past retention into daily counts"
+
+    def handle(self, *args, **options):
+        compacted = compact_listening_events()
+        self.stdout.write(f"Compacted listening events of {compacted} days")
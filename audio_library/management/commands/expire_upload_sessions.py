@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from audio_library.services.uploads import expire_upload_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete unfinished track uploads past UPLOAD_SESSION_TTL_HOURS"
+
+    def handle(self, *args, **options):
+        expired = expire_upload_sessions()
+        self.stdout.write(f"Expired {expired} upload sessions")
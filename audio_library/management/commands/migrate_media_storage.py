@@ -0,0 +1,36 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from core.storage import get_media_file_fields, media_storage, recount_media_blobs
+
+
+class Command(BaseCommand):
+    help = "Move uploaded media into the content-addressed layout"
+
+    def handle(self, *args, **options):
+        moved = {}
+        for model, field_name in get_media_file_fields():
+            field = model._meta.get_field(field_name)
+            rows = (
+                model._base_manager.exclude(**{f"{field_name}__isnull": True})
+                .exclude(**{field_name: ""})
+                .values_list("pk", field_name)
+            )
+            for pk, name in rows.iterator():
+                if media_storage.is_blob_name(name):
+                    continue
+                if name not in moved:
+                    path = media_storage.path(name)
+                    if not os.path.exists(path):
+                        self.stderr.write(f"{model.__name__} {pk}: {name} is missing")
+                        continue
+                    upload_name = field.generate_filename(None, os.path.basename(name))
+                    with open(path, "rb") as file:
+                        moved[name] = media_storage.save(upload_name, File(file))
+                    os.remove(path)
+                model._base_manager.filter(pk=pk).update(**{field_name: moved[name]})
+
+        recount_media_blobs()
+        self.stdout.write(f"Moved {len(moved)} files into content-addressed storage")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from audio_library.services.deletion import file_deletions
+
+
+class Command(BaseCommand):
+    help = "Delete media files left in the deletion queue"
+
+    def handle(self, *args, **options):
+        purged = file_deletions.purge()
+        self.stdout.write(f"Purged {purged} files")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from audio_library.services.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Recreate the track search index from the database"
+
+    def handle(self, *args, **options):
+        rebuild_search_index()
+        self.stdout.write("Search index rebuilt")
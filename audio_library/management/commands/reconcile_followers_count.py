@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from audio_library.services.feed import reconcile_followers_count
+
+
+class Command(BaseCommand):
+    help = "Repair followers counters that drifted from the followers table"
+
+    def handle(self, *args, **options):
+        repaired = reconcile_followers_count()
+        self.stdout.write(f"Repaired followers of {repaired} users")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from audio_library.services.likes import reconcile_track_likes
+
+
+class Command(BaseCommand):
+    help = "Repair track like counters that drifted from the likes table"
+
+    def handle(self, *args, **options):
+        repaired = reconcile_track_likes()
+        self.stdout.write(f"Repaired likes of {repaired} tracks")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from audio_library.services.trending import refresh_trending_charts
+
+
+class Command(BaseCommand):
+    help = "Rebuild the trending charts from recent play buckets"
+
+    def handle(self, *args, **options):
+        refresh_trending_charts()
+        self.stdout.write("Trending charts refreshed")
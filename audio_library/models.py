@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from users.models import User
 from django.core.validators import FileExtensionValidator
@@ -8,6 +10,32 @@ from core.services import (
     get_path_upload_playlist_cover,
     get_path_upload_track_cover,
 )
+from core.storage import media_storage
+
+
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class FileDeletion(models.Model):
+    name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class SoftDeleteManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
+class TrackQuerySet(models.QuerySet):
+    def with_related(self):
+        """Everything TrackSerializer nests, in a constant number of queries."""
+        return self.select_related("license", "album", "user").prefetch_related(
+            "genre", "user__social_links"
+        )
 
 
 class License(models.Model):
@@ -24,10 +52,12 @@ class Genre(models.Model):
 
 class Album(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="albums")
-    name = models.CharField(max_length=50, unique=True)
+    name = models.CharField(max_length=50)
     description = models.TextField(max_length=500)
     private = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
     cover = models.ImageField(
+        storage=media_storage,
         upload_to=get_path_upload_album_cover,
         blank=True,
         null=True,
@@ -36,6 +66,20 @@ class Album(models.Model):
             validate_size_image,
         ],
     )
+    is_deleted = models.BooleanField(default=False, db_index=True)
+
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        # A deleted album's name can be used again
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name"],
+                condition=models.Q(is_deleted=False),
+                name="unique_album_name",
+            )
+        ]
 
 
 class Track(models.Model):
@@ -49,11 +93,13 @@ class Track(models.Model):
     authors_link = models.CharField(max_length=300, blank=True, null=True)
     private = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     auditions = models.PositiveIntegerField(default=0)
     downloads = models.PositiveIntegerField(default=0)
     likes = models.PositiveIntegerField(default=0)
     user_like = models.ManyToManyField(User, related_name="liked_tracks")
     cover = models.ImageField(
+        storage=media_storage,
         upload_to=get_path_upload_track_cover,
         blank=True,
         null=True,
@@ -63,9 +109,29 @@ class Track(models.Model):
         ],
     )
     file = models.FileField(
+        storage=media_storage,
         upload_to=get_path_upload_track,
         validators=[FileExtensionValidator(allowed_extensions=["mp3", "wav"])],
     )
+    # Name the file was uploaded with, the stored one is its content hash
+    file_name = models.CharField(max_length=255, blank=True)
+    renditions = models.JSONField(default=dict, blank=True)
+    duration = models.FloatField(blank=True, null=True)
+    bitrate = models.PositiveIntegerField(blank=True, null=True)
+    sample_rate = models.PositiveIntegerField(blank=True, null=True)
+    file_size = models.PositiveBigIntegerField(blank=True, null=True)
+    is_deleted = models.BooleanField(default=False, db_index=True)
+    # Pushed into subscribers' inboxes when published, pulled by feeds if not
+    fanned_out = models.BooleanField(default=False)
+
+    objects = SoftDeleteManager.from_queryset(TrackQuerySet)()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="track_feed"),
+            models.Index(fields=["user", "-created_at", "-id"], name="author_feed"),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.title}"
@@ -78,6 +144,12 @@ class Comment(models.Model):
     )
     text = models.TextField(max_length=1500)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["track", "-created_at", "-id"], name="comment_feed")
+        ]
 
 
 class PlayList(models.Model):
@@ -85,6 +157,7 @@ class PlayList(models.Model):
     title = models.CharField(max_length=100)
     track = models.ManyToManyField(Track, related_name="track_playlist")
     cover = models.ImageField(
+        storage=media_storage,
         upload_to=get_path_upload_playlist_cover,
         blank=True,
         null=True,
@@ -93,3 +166,119 @@ class PlayList(models.Model):
             validate_size_image,
         ],
     )
+    is_deleted = models.BooleanField(default=False, db_index=True)
+
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
+
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="upload_sessions"
+    )
+    file_name = models.CharField(max_length=150)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(
+        UploadSession, on_delete=models.CASCADE, related_name="chunks"
+    )
+    index = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ("session", "index")
+
+
+class TrackPlayBucket(models.Model):
+    HOUR = "hour"
+    PERIODS = ((HOUR, "Hour"),)
+
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name="plays")
+    period = models.CharField(max_length=4, choices=PERIODS)
+    start = models.DateTimeField()
+    plays = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("track", "period", "start")
+        indexes = [models.Index(fields=["period", "start"], name="play_bucket_period")]
+
+
+class TrendingTrack(models.Model):
+    genre = models.ForeignKey(
+        Genre, on_delete=models.CASCADE, blank=True, null=True, related_name="trending"
+    )
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name="trending")
+    rank = models.PositiveIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=["genre", "rank"], name="trending_chart")]
+
+
+class SimilarTrack(models.Model):
+    """Nearest neighbours of a track by playlist and like co-occurrence."""
+
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name="+")
+    similar = models.ForeignKey(Track, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=["track", "rank"], name="similar_tracks")]
+
+
+class ListeningEvent(models.Model):
+    PLAY = "play"
+    DOWNLOAD = "download"
+    KINDS = ((PLAY, "Play"), (DOWNLOAD, "Download"))
+
+    track = models.ForeignKey(
+        Track, on_delete=models.CASCADE, related_name="listening_events"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, blank=True, null=True, related_name="+"
+    )
+    kind = models.CharField(max_length=8, choices=KINDS)
+    created_at = models.DateTimeField(db_index=True)
+
+
+class DailyListening(models.Model):
+    """ListeningEvent rows past retention, compacted into daily counts."""
+
+    day = models.DateField()
+    track = models.ForeignKey(
+        Track, on_delete=models.CASCADE, related_name="daily_listening"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, blank=True, null=True, related_name="+"
+    )
+    kind = models.CharField(max_length=8, choices=ListeningEvent.KINDS)
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=["day", "track"], name="daily_listening_day")]
+
+
+class FeedItem(models.Model):
+    """A public track pushed into the feed of one of its author's subscribers."""
+
+    subscriber = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="feed_items"
+    )
+    track = models.ForeignKey(
+        Track, on_delete=models.CASCADE, related_name="feed_items"
+    )
+    # Copied from the track so the inbox is paged by its own index
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("subscriber", "track")
+        indexes = [
+            models.Index(
+                fields=["subscriber", "-created_at", "-track"], name="subscriber_feed"
+            )
+        ]
@@ -1,10 +1,18 @@
+import os
+
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+from django.conf import settings
 from audio_library import models
-from core.services import delete_old_file
+from audio_library.services.deletion import file_deletions, get_derived_media
+from audio_library.services.uploads import get_missing_chunks
+from core.services import get_path_track_media
+from core.thumbnails import ThumbnailsField
+from core.upload_handlers import UploadErrorsMixin
 from users.serializers.base_serializers import AuthorSerializer
 
 
-class BaseSerializer(serializers.ModelSerializer):
+class BaseSerializer(UploadErrorsMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
 
 
@@ -21,16 +29,26 @@ class LicenseSerializer(BaseSerializer):
 
 
 class AlbumSerializer(BaseSerializer):
+    cover_thumbnails = ThumbnailsField(source="cover")
+    # Checked against albums that aren't deleted, like unique_album_name
+    name = serializers.CharField(
+        max_length=50,
+        validators=[UniqueValidator(queryset=models.Album.objects.all())],
+    )
+
     class Meta:
         model = models.Album
-        fields = ("id", "name", "description", "cover", "private")
+        fields = ("id", "name", "description", "cover", "cover_thumbnails", "private")
 
     def update(self, instance, validated_data):
-        delete_old_file(instance.cover.path)
+        if "cover" in validated_data:
+            file_deletions.push(instance.cover.name)
         return super().update(instance, validated_data)
 
 
 class CreateTrackSerializer(BaseSerializer):
+    cover_thumbnails = ThumbnailsField(source="cover")
+
     class Meta:
         model = models.Track
         fields = (
@@ -45,15 +63,81 @@ class CreateTrackSerializer(BaseSerializer):
             "created_at",
             "auditions",
             "downloads",
+            "likes",
             "cover",
+            "cover_thumbnails",
             "file",
+            "duration",
+            "bitrate",
+            "sample_rate",
+            "file_size",
         )
-        read_only_fields = ["auditions", "downloads", "user"]
+        read_only_fields = [
+            "auditions",
+            "downloads",
+            "likes",
+            "user",
+            "duration",
+            "bitrate",
+            "sample_rate",
+            "file_size",
+        ]
+
+    def set_file_name(self, validated_data) -> None:
+        if "file" in validated_data:
+            validated_data["file_name"] = os.path.basename(validated_data["file"].name)[
+                :255
+            ]
+
+    def create(self, validated_data):
+        self.set_file_name(validated_data)
+        return super().create(validated_data)
 
     def update(self, instance, validated_data):
-        delete_old_file(instance.file.path)
-        delete_old_file(instance.cover.path)
-        return super().update(instance, validated_data)
+        self.set_file_name(validated_data)
+        derived = []
+        if "file" in validated_data:
+            file_deletions.push(instance.file.name)
+            derived = get_derived_media(instance)
+        if "cover" in validated_data:
+            file_deletions.push(instance.cover.name)
+        instance = super().update(instance, validated_data)
+        # Re-uploaded content is processed into the same directory again
+        directory = f"{get_path_track_media(instance)}/"
+        for name in derived:
+            if not f"{name}/".startswith(directory):
+                file_deletions.push(name)
+        return instance
+
+
+class UploadTrackSerializer(CreateTrackSerializer):
+    class Meta(CreateTrackSerializer.Meta):
+        read_only_fields = CreateTrackSerializer.Meta.read_only_fields + ["file"]
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    missing = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.UploadSession
+        fields = ("id", "file_name", "size", "chunk_size", "created_at", "missing")
+        read_only_fields = ("chunk_size",)
+
+    def get_missing(self, instance):
+        return get_missing_chunks(instance)
+
+    def validate_file_name(self, value):
+        extension = os.path.splitext(value)[1].lower()
+        if extension not in (".mp3", ".wav"):
+            raise serializers.ValidationError("Only mp3 and wav files are allowed")
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.TRACK_SIZE_MB_LIMIT * 1024 * 1024:
+            raise serializers.ValidationError(
+                f"Your file shouldn't be more than {settings.TRACK_SIZE_MB_LIMIT}MB"
+            )
+        return value
 
 
 class TrackSerializer(CreateTrackSerializer):
@@ -63,13 +147,32 @@ class TrackSerializer(CreateTrackSerializer):
     user = AuthorSerializer()
 
 
+class TrendingTrackSerializer(serializers.ModelSerializer):
+    track = TrackSerializer()
+
+    class Meta:
+        model = models.TrendingTrack
+        fields = ("rank", "score", "track")
+
+
+class SimilarTrackSerializer(serializers.ModelSerializer):
+    track = TrackSerializer(source="similar")
+
+    class Meta:
+        model = models.SimilarTrack
+        fields = ("rank", "score", "track")
+
+
 class CreatePlayListSerializer(BaseSerializer):
+    cover_thumbnails = ThumbnailsField(source="cover")
+
     class Meta:
         model = models.PlayList
-        fields = ("id", "title", "cover", "track")
+        fields = ("id", "title", "cover", "cover_thumbnails", "track")
 
     def update(self, instance, validated_data):
-        delete_old_file(instance.cover.path)
+        if "cover" in validated_data:
+            file_deletions.push(instance.cover.name)
         return super().update(instance, validated_data)
 
 
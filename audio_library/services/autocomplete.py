@@ -0,0 +1,218 @@
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, List, Set, Tuple
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from audio_library.models import Album, Track
+from audio_library.services.counters import flusher
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+NON_WORD_RE = re.compile(r"[\W_]+")
+# Matches looked at per query before ranking, bounds short prefixes
+SCAN_LIMIT = 1000
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return NON_WORD_RE.sub(" ", text.casefold()).strip()
+
+
+def get_keys(text: str) -> List[str]:
+    """The text from every word onwards, so any word start matches."""
+    words = normalize(text).split()
+    return [" ".join(words[index:]) for index in range(len(words))]
+
+
+class AutocompleteSnapshot:
+    """
+    Sorted array of `(key, kind, pk)` with the rows it was built from. It is
+    never changed once searchable: a sync builds the next snapshot beside it.
+    """
+
+    def __init__(self, previous=None):
+        self.entries: List[Tuple[str, str, int]] = []
+        self.tracks: Dict[int, dict] = dict(previous.tracks) if previous else {}
+        self.artists: Dict[int, dict] = dict(previous.artists) if previous else {}
+        self.artist_auditions = Counter(previous and previous.artist_auditions)
+        self.artist_tracks = Counter(previous and previous.artist_tracks)
+        self.previous = previous
+        self.removed: Set[Tuple[str, int]] = set()
+        self.added: List[Tuple[str, str, int]] = []
+
+    def remove_track(self, pk: int) -> None:
+        track = self.tracks.pop(pk, None)
+        if track is not None:
+            self.removed.add(("track", pk))
+            self.artist_auditions[track["user_id"]] -= track["auditions"]
+            self.artist_tracks[track["user_id"]] -= 1
+
+    def set_track(self, track: Track) -> None:
+        self.remove_track(track.pk)
+        visible = not (
+            track.is_deleted or track.private or (track.album and track.album.private)
+        )
+        if not visible:
+            return
+        keys = get_keys(track.title)
+        self.tracks[track.pk] = {
+            "title": track.title,
+            "user_id": track.user_id,
+            "auditions": track.auditions,
+        }
+        self.artist_auditions[track.user_id] += track.auditions
+        self.artist_tracks[track.user_id] += 1
+        self.added.extend((key, "track", track.pk) for key in keys)
+
+    def set_artist(self, user: User) -> None:
+        if self.artists.pop(user.pk, None) is not None:
+            self.removed.add(("artist", user.pk))
+        if not user.username:
+            return
+        self.artists[user.pk] = {"username": user.username}
+        self.added.extend((key, "artist", user.pk) for key in get_keys(user.username))
+
+    def load(self, tracks, users) -> None:
+        for track in tracks.select_related("album").iterator(chunk_size=2000):
+            self.set_track(track)
+        for user in users.iterator(chunk_size=2000):
+            self.set_artist(user)
+
+    def seal(self) -> None:
+        """Sort the new keys once and merge them with the kept old ones."""
+        kept = self.previous.entries if self.previous else []
+        if self.removed:
+            kept = [entry for entry in kept if entry[1:] not in self.removed]
+        self.entries = list(heapq.merge(kept, sorted(self.added)))
+        self.previous, self.removed, self.added = None, set(), []
+
+    def get_rank(self, kind: str, pk: int) -> int:
+        if kind == "track":
+            return self.tracks[pk]["auditions"]
+        return self.artist_auditions[pk]
+
+    def get_suggestion(self, kind: str, pk: int) -> dict:
+        if kind == "track":
+            track = self.tracks[pk]
+            artist = self.artists.get(track["user_id"])
+            return {
+                "type": "track",
+                "id": pk,
+                "title": track["title"],
+                "author": artist and artist["username"],
+            }
+        return {"type": "artist", "id": pk, "username": self.artists[pk]["username"]}
+
+    def search(self, prefix: str, limit: int) -> List[dict]:
+        matches = set()
+        index = bisect.bisect_left(self.entries, (prefix,))
+        for key, kind, pk in self.entries[index : index + SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            # Artists are suggested only while they have public tracks
+            if kind == "track" or self.artist_tracks[pk] > 0:
+                matches.add((kind, pk))
+        best = heapq.nlargest(
+            limit, matches, key=lambda match: (self.get_rank(*match), match[1])
+        )
+        return [self.get_suggestion(*match) for match in best]
+
+
+class AutocompleteIndex:
+    """
+    Prefix search over an AutocompleteSnapshot. Searches only read the
+    current snapshot. The background flusher syncs it after searches,
+    re-reading rows changed since the last sync at most every
+    AUTOCOMPLETE_REFRESH_INTERVAL seconds and rebuilding it every
+    AUTOCOMPLETE_REBUILD_INTERVAL seconds to pick up new audition counts.
+    A new snapshot replaces the old one in a single assignment. Only the
+    first search of a process waits for the initial build.
+    """
+
+    def __init__(self, refresh_interval: float, rebuild_interval: float):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self.pending = threading.Event()
+        self.snapshot = None
+        self.synced_at = None
+        self.refreshed_at = 0.0
+        self.rebuilt_at = 0.0
+
+    def sync(self) -> None:
+        with self._lock:
+            started = timezone.now()
+            now = time.monotonic()
+            rebuild = self.snapshot is None or (
+                now - self.rebuilt_at >= self.rebuild_interval
+            )
+            self.refreshed_at = now
+            latest = [
+                Track.all_objects.aggregate(latest=Max("updated_at"))["latest"],
+                Album.all_objects.aggregate(latest=Max("updated_at"))["latest"],
+                User.objects.aggregate(latest=Max("updated_at"))["latest"],
+            ]
+            if rebuild:
+                snapshot = AutocompleteSnapshot()
+                snapshot.load(Track.objects.all(), User.objects.all())
+                self.rebuilt_at = now
+            else:
+                snapshot = AutocompleteSnapshot(self.snapshot)
+                # Rows saved just before the last sync may commit after it
+                since = self.synced_at - SYNC_OVERLAP
+                snapshot.load(
+                    Track.all_objects.filter(
+                        Q(updated_at__gte=since) | Q(album__updated_at__gte=since)
+                    ),
+                    User.objects.filter(updated_at__gte=since),
+                )
+            snapshot.seal()
+            self.snapshot = snapshot
+            # Without rows yet, the next sync reads whatever was saved since
+            self.synced_at = max(
+                (value for value in latest if value),
+                default=self.synced_at or started,
+            )
+
+    def flush(self) -> None:
+        if (
+            not self.pending.is_set()
+            or time.monotonic() - self.refreshed_at < self.refresh_interval
+        ):
+            return
+        self.pending.clear()
+        try:
+            self.sync()
+        except Exception:
+            logger.exception("Couldn't sync the autocomplete index")
+
+    def search(self, prefix: str, limit: int = 10) -> List[dict]:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        if self.snapshot is None:
+            self.sync()
+        else:
+            self.pending.set()
+            flusher.notify(self)
+        return self.snapshot.search(prefix, limit)
+
+
+autocomplete_index = flusher.register(
+    AutocompleteIndex(
+        settings.AUTOCOMPLETE_REFRESH_INTERVAL, settings.AUTOCOMPLETE_REBUILD_INTERVAL
+    )
+)
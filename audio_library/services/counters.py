@@ -0,0 +1,202 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from audio_library.models import Track
+from audio_library.services.list_cache import (
+    GLOBAL_SCOPE,
+    bump_generations,
+    get_author_scope,
+    get_last_modified,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Collects writes in memory and hands them to the database in batches.
+    Subclasses implement `write` for a batch taken out of the buffer.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = self.empty()
+
+    def empty(self):
+        raise NotImplementedError
+
+    def write(self, batch) -> None:
+        raise NotImplementedError
+
+    def merge(self, batch) -> None:
+        raise NotImplementedError
+
+    def take(self):
+        with self._lock:
+            batch, self._pending = self._pending, self.empty()
+        return batch
+
+    def flush(self) -> None:
+        batch = self.take()
+        if not batch:
+            return
+        try:
+            self.write(batch)
+        except Exception:
+            logger.exception("Couldn't flush %s, keeping batch", type(self).__name__)
+            with self._lock:
+                self.merge(batch)
+
+
+class TrackCounterBuffer(WriteBehindBuffer):
+    fields = ("auditions", "downloads")
+
+    def empty(self) -> Counter:
+        return Counter()
+
+    def increment(self, track_pk: int, field: str, value: int = 1) -> None:
+        if field not in self.fields:
+            raise ValueError(f"Unknown track counter {field}")
+        with self._lock:
+            self._pending[(track_pk, field)] += value
+        flusher.notify(self)
+
+    def merge(self, batch: Counter) -> None:
+        self._pending.update(batch)
+
+    def write(self, batch: Counter) -> None:
+        updates: Dict[int, Dict[str, int]] = {}
+        for (track_pk, field), value in batch.items():
+            updates.setdefault(track_pk, {})[field] = value
+        with transaction.atomic():
+            for track_pk, fields in sorted(updates.items()):
+                Track.objects.filter(pk=track_pk).update(
+                    **{field: F(field) + value for field, value in fields.items()}
+                )
+            authors = list(
+                Track.all_objects.filter(pk__in=updates).values_list(
+                    "user_id", flat=True
+                )
+            )
+        counter_lists.add(authors)
+        flusher.notify(counter_lists)
+
+
+class CounterListBumper:
+    """
+    Bumps the cached track lists showing flushed counters at most every
+    `interval` seconds, so steady plays don't keep them from being cached
+    and lists show counters up to about that much older than the database.
+    The global list is bumped once no worker did so for `interval` seconds,
+    unless a bump since the counters were written already showed them.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._authors = set()
+        self._written_at = None
+        self._bumped_at = 0.0
+
+    def add(self, user_pks) -> None:
+        with self._lock:
+            self._authors.update(user_pks)
+            self._written_at = time.time()
+
+    def flush(self) -> None:
+        now = time.monotonic()
+        if self._authors and now - self._bumped_at >= self.interval:
+            with self._lock:
+                authors, self._authors = self._authors, set()
+            self._bumped_at = now
+            bump_generations(*(get_author_scope(pk) for pk in authors))
+
+        written_at = self._written_at
+        if written_at is None:
+            return
+        bumped_at = get_last_modified(GLOBAL_SCOPE)
+        if bumped_at is None or bumped_at <= written_at:
+            if bumped_at is not None and time.time() - bumped_at < self.interval:
+                return
+            bump_generations(GLOBAL_SCOPE)
+        with self._lock:
+            if self._written_at == written_at:
+                self._written_at = None
+
+
+class BackgroundFlusher:
+    """
+    Daemon thread flushing every registered buffer each `interval` seconds
+    and once more when the worker process exits. A non-positive interval
+    turns the buffers into write-through ones.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.buffers: List[WriteBehindBuffer] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.stop)
+
+    def register(self, buffer: WriteBehindBuffer) -> WriteBehindBuffer:
+        self.buffers.append(buffer)
+        return buffer
+
+    def notify(self, buffer: WriteBehindBuffer) -> None:
+        if self.interval <= 0:
+            buffer.flush()
+        else:
+            self.ensure_started()
+
+    def ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="write-behind-flusher", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            for buffer in self.buffers:
+                # Like a request, drop connections the database closed or
+                # that outlived CONN_MAX_AGE, the thread lives as long as
+                # the worker
+                close_old_connections()
+                try:
+                    buffer.flush()
+                except Exception:
+                    logger.exception("Couldn't flush %s", type(buffer).__name__)
+                finally:
+                    close_old_connections()
+
+    def flush(self) -> None:
+        for buffer in self.buffers:
+            buffer.flush()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.flush()
+
+
+flusher = BackgroundFlusher(settings.WRITE_BEHIND_FLUSH_INTERVAL)
+track_counters = flusher.register(TrackCounterBuffer())
+counter_lists = flusher.register(
+    CounterListBumper(settings.TRACK_LIST_COUNTERS_MAX_AGE)
+)
@@ -0,0 +1,111 @@
+import logging
+import os
+import shutil
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from audio_library.models import Album, FileDeletion, Track
+from audio_library.services.counters import flusher
+from audio_library.services.list_cache import bump_author_generations
+from audio_library.services.search import index_tracks, unindex_track
+from core.services import get_path_track_media
+from core.storage import media_storage
+
+logger = logging.getLogger(__name__)
+
+
+class FileDeletionQueue:
+    """
+    Durable queue of media files to delete. Names are stored in the same
+    transaction as the change that orphaned them, and the files are purged
+    in batches by the background flusher once that transaction commits.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self._pending = threading.Event()
+
+    def push(self, name: str) -> None:
+        if not name:
+            return
+        FileDeletion.objects.create(name=name)
+        transaction.on_commit(self.wake)
+
+    def wake(self) -> None:
+        self._pending.set()
+        flusher.notify(self)
+
+    def flush(self) -> None:
+        if not self._pending.is_set():
+            return
+        self._pending.clear()
+        try:
+            self.purge()
+        except Exception:
+            logger.exception("Couldn't purge deleted files, retrying later")
+            self._pending.set()
+
+    def purge(self) -> int:
+        purged = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    FileDeletion.objects.select_for_update(skip_locked=True).order_by(
+                        "pk"
+                    )[: self.batch_size]
+                )
+                if not batch:
+                    return purged
+                for deletion in batch:
+                    delete_media(deletion.name)
+                FileDeletion.objects.filter(pk__in=[d.pk for d in batch]).delete()
+            purged += len(batch)
+
+
+def delete_media(name: str) -> None:
+    if os.path.isdir(media_storage.path(name)):
+        shutil.rmtree(media_storage.path(name), ignore_errors=True)
+    else:
+        media_storage.delete(name)
+
+
+def get_derived_media(track: Track) -> list:
+    """Renditions, HLS segments and waveform made from the track's upload."""
+    names = list(track.renditions.values())
+    if track.file:
+        names.append(get_path_track_media(track))
+    return names
+
+
+def get_track_media(track: Track) -> list:
+    return [track.file.name, track.cover.name, *get_derived_media(track)]
+
+
+def soft_delete(instance) -> None:
+    """Flag a track, album or playlist deleted and queue its files."""
+    with transaction.atomic():
+        if isinstance(instance, Track):
+            names = get_track_media(instance)
+        else:
+            names = [instance.cover.name]
+        changes = {"is_deleted": True}
+        if isinstance(instance, (Track, Album)):
+            changes["updated_at"] = timezone.now()
+        if isinstance(instance, Album):
+            album_tracks = Track.objects.filter(album=instance)
+            track_pks = list(album_tracks.values_list("pk", flat=True))
+            album_tracks.update(album=None, updated_at=timezone.now())
+            index_tracks(Track.objects.filter(pk__in=track_pks))
+        type(instance).objects.filter(pk=instance.pk).update(**changes)
+        instance.is_deleted = True
+        if isinstance(instance, Track):
+            unindex_track(instance.pk)
+        for name in names:
+            file_deletions.push(name)
+    bump_author_generations(instance.user_id)
+
+
+file_deletions = flusher.register(FileDeletionQueue(settings.FILE_DELETION_BATCH_SIZE))
@@ -0,0 +1,188 @@
+import heapq
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from audio_library.models import FeedItem, Track
+from users.models import Follower, User
+
+Position = Tuple[datetime, int]
+
+
+def is_fanned_out(followers_count: int) -> bool:
+    """
+    Tracks of artists with at most FEED_FANOUT_MAX_FOLLOWERS subscribers are
+    pushed into inboxes, the rest are merged into the feed at read time.
+    """
+    return followers_count <= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def is_feed_visible(track: Track) -> bool:
+    return not (
+        track.private
+        or track.is_deleted
+        or (track.album_id is not None and track.album.private)
+    )
+
+
+def fan_out_track(track: Track) -> None:
+    """
+    Push the track into its subscribers' inboxes, or take it back out. The
+    choice between push and pull is recorded in `fanned_out` when the track
+    is first pushed, so later changes of the artist's followers count don't
+    move it out of either source.
+    """
+    if not is_feed_visible(track):
+        FeedItem.objects.filter(track_id=track.pk).delete()
+        return
+    if not track.fanned_out:
+        followers_count = (
+            User.objects.filter(pk=track.user_id)
+            .values_list("followers_count", flat=True)
+            .first()
+        )
+        if followers_count is None or not is_fanned_out(followers_count):
+            return
+    subscribers = Follower.objects.filter(user_id=track.user_id).values_list(
+        "subscriber_id", flat=True
+    )
+    with transaction.atomic():
+        # An update keeps the save signals from fanning out once more
+        Track.all_objects.filter(pk=track.pk).update(fanned_out=True)
+        track.fanned_out = True
+        FeedItem.objects.bulk_create(
+            (
+                FeedItem(
+                    subscriber_id=pk, track_id=track.pk, created_at=track.created_at
+                )
+                for pk in subscribers.iterator()
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+def backfill_inbox(follower: Follower) -> None:
+    """
+    Copy the artist's latest pushed tracks into a new subscriber's inbox,
+    feeds only pull the tracks that weren't pushed.
+    """
+    tracks = (
+        Track.objects.filter(
+            Q(album=None) | Q(album__private=False),
+            user_id=follower.user_id,
+            private=False,
+            fanned_out=True,
+        )
+        .order_by("-created_at", "-id")
+        .values_list("pk", "created_at")[: settings.FEED_FOLLOW_BACKFILL]
+    )
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(
+                subscriber_id=follower.subscriber_id,
+                track_id=pk,
+                created_at=created_at,
+            )
+            for pk, created_at in tracks
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def follow_changed(follower: Follower, delta: int) -> None:
+    User.objects.filter(pk=follower.user_id).update(
+        # Follows made before the counter may be missing from it
+        followers_count=Greatest(F("followers_count") + delta, 0)
+    )
+    if delta > 0:
+        backfill_inbox(follower)
+    else:
+        FeedItem.objects.filter(
+            subscriber_id=follower.subscriber_id, track__user_id=follower.user_id
+        ).delete()
+
+
+def reconcile_followers_count() -> int:
+    """Reset drifted `followers_count` counters to the number of followers."""
+    followers = (
+        Follower.objects.filter(user_id=OuterRef("pk"))
+        .order_by()
+        .values("user_id")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    actual = Coalesce(Subquery(followers), 0)
+    drifted = User.objects.annotate(actual=actual).exclude(followers_count=F("actual"))
+    return User.objects.filter(pk__in=drifted.values("pk")).update(
+        followers_count=actual
+    )
+
+
+def schedule_fan_out(track: Track) -> None:
+    transaction.on_commit(lambda: fan_out_track(track))
+
+
+class Feed:
+    """
+    Newest public tracks of the artists a user follows. Both sources are
+    read newest first from `position` with an index range scan, so a page
+    costs the same however many artists are followed or how deep it is.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def get_inbox(self, position: Optional[Position], size: int):
+        items = FeedItem.objects.filter(
+            Q(track__album=None) | Q(track__album__private=False),
+            subscriber=self.user,
+            track__private=False,
+            track__is_deleted=False,
+        )
+        if position:
+            created_at, pk = position
+            items = items.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, track_id__lt=pk)
+            )
+        return items.order_by("-created_at", "-track_id").values_list(
+            "created_at", "track_id"
+        )[:size]
+
+    def get_pulled(self, position: Optional[Position], size: int):
+        artists = Follower.objects.filter(subscriber=self.user).values("user_id")
+        tracks = Track.objects.filter(
+            Q(album=None) | Q(album__private=False),
+            user__in=artists,
+            private=False,
+            fanned_out=False,
+        )
+        if position:
+            created_at, pk = position
+            tracks = tracks.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+        return tracks.order_by("-created_at", "-id").values_list("created_at", "pk")[
+            :size
+        ]
+
+    def page(self, position: Optional[Position], size: int) -> List[Track]:
+        merged = heapq.merge(
+            self.get_inbox(position, size),
+            self.get_pulled(position, size),
+            reverse=True,
+        )
+        pks: List[int] = []
+        for _, pk in merged:
+            # A track saved from a copy older than its fan-out is in both
+            if pks and pks[-1] == pk:
+                continue
+            pks.append(pk)
+            if len(pks) == size:
+                break
+        tracks = Track.objects.with_related().in_bulk(pks)
+        return [tracks[pk] for pk in pks if pk in tracks]
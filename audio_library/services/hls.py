@@ -0,0 +1,68 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from audio_library.models import Track
+from audio_library.services.stream_urls import sign_stream_url
+from core.services import get_path_track_hls
+
+HLS_MANIFEST_NAME = "index.m3u8"
+
+
+def get_hls_manifest_name(track: Track) -> str:
+    return os.path.join(get_path_track_hls(track), HLS_MANIFEST_NAME)
+
+
+def sign_hls_manifest(track: Track, content: bytes) -> bytes:
+    """
+    Point the segments of a stored manifest, listed by file name, at signed
+    links, so they are only served while the track is public.
+    """
+    hls_dir = get_path_track_hls(track)
+    lines = []
+    for line in content.decode("utf-8").splitlines():
+        if line and not line.startswith("#"):
+            line = sign_stream_url(f"{hls_dir}/{line}")[0]
+        lines.append(line)
+    return "\n".join(lines).encode("utf-8") + b"\n"
+
+
+def segment_track(track: Track) -> None:
+    hls_dir = default_storage.path(get_path_track_hls(track))
+    os.makedirs(os.path.dirname(hls_dir), exist_ok=True)
+    build_dir = tempfile.mkdtemp(dir=os.path.dirname(hls_dir))
+    try:
+        subprocess.run(
+            [
+                settings.FFMPEG_BINARY,
+                "-y",
+                "-loglevel",
+                "error",
+                "-i",
+                track.file.path,
+                "-vn",
+                "-c:a",
+                "aac",
+                "-b:a",
+                "192k",
+                "-f",
+                "hls",
+                "-hls_time",
+                str(settings.HLS_SEGMENT_DURATION),
+                "-hls_playlist_type",
+                "vod",
+                "-hls_segment_filename",
+                os.path.join(build_dir, "segment_%05d.ts"),
+                os.path.join(build_dir, HLS_MANIFEST_NAME),
+            ],
+            check=True,
+            capture_output=True,
+        )
+        shutil.rmtree(hls_dir, ignore_errors=True)
+        os.replace(build_dir, hls_dir)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from audio_library.models import Track
+from audio_library.services.list_cache import bump_track_generations
+
+TrackLike = Track.user_like.through
+
+
+def like_track(track: Track, user) -> bool:
+    """Like the track once, returns False when it was liked already."""
+    with transaction.atomic():
+        _, created = TrackLike.objects.get_or_create(track_id=track.pk, user_id=user.pk)
+        if created:
+            Track.objects.filter(pk=track.pk).update(likes=F("likes") + 1)
+            bump_track_generations([track.user_id])
+    return created
+
+
+def unlike_track(track: Track, user) -> bool:
+    with transaction.atomic():
+        deleted, _ = TrackLike.objects.filter(
+            track_id=track.pk, user_id=user.pk
+        ).delete()
+        if deleted:
+            # A drifted counter may be lower than the likes being removed
+            Track.objects.filter(pk=track.pk).update(
+                likes=Greatest(F("likes") - deleted, 0)
+            )
+            bump_track_generations([track.user_id])
+    return bool(deleted)
+
+
+def reconcile_track_likes() -> int:
+    """Reset drifted `likes` counters to the size of `user_like`."""
+    like_counts = (
+        TrackLike.objects.filter(track_id=OuterRef("pk"))
+        .order_by()
+        .values("track_id")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    actual = Coalesce(Subquery(like_counts), 0)
+    drifted = Track.all_objects.annotate(actual=actual).exclude(likes=F("actual"))
+    with transaction.atomic():
+        authors = list(drifted.values_list("user_id", flat=True).distinct())
+        updated = Track.all_objects.filter(pk__in=drifted.values("pk")).update(
+            likes=actual
+        )
+        if updated:
+            bump_track_generations(authors)
+    return updated
@@ -0,0 +1,73 @@
+import time
+from functools import partial
+from typing import Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+GENERATION_KEY = "list_cache:generation:{}"
+MODIFIED_KEY = "list_cache:modified:{}"
+
+# Scopes of cached list responses, see audio_library.signals
+GLOBAL_SCOPE = "global"
+GENRES_SCOPE = "genres"
+
+
+def get_author_scope(user_pk: int) -> str:
+    return f"author:{user_pk}"
+
+
+def get_comments_scope(track_pk: int) -> str:
+    return f"comments:{track_pk}"
+
+
+def get_generations(*scopes: str) -> list:
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # An evicted counter restarts from the clock, so it never
+            # matches a generation that is still part of a cached key
+            cache.add(key, time.time_ns(), timeout=None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def get_last_modified(*scopes: str) -> Optional[int]:
+    """Unix time of the latest bump of any of the scopes, if it's known."""
+    modified = cache.get_many([MODIFIED_KEY.format(scope) for scope in scopes])
+    return max(modified.values(), default=None)
+
+
+def incr_generations(scopes) -> None:
+    now = int(time.time())
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+        cache.set(MODIFIED_KEY.format(scope), now, timeout=None)
+
+
+def bump_generations(*scopes: str) -> None:
+    # Bumped again on commit: a response cached by another request before
+    # the change became visible must not survive under the new generation
+    incr_generations(scopes)
+    transaction.on_commit(partial(incr_generations, scopes))
+
+
+def bump_author_generations(user_pk: int, listed: bool = True) -> None:
+    """
+    Bump the author's lists, and the global track list too unless the change
+    can't show up there (`listed` False).
+    """
+    scopes = [get_author_scope(user_pk)]
+    if listed:
+        scopes.append(GLOBAL_SCOPE)
+    bump_generations(*scopes)
+
+
+def bump_track_generations(user_pks) -> None:
+    """Bump the lists showing counters of tracks by these authors."""
+    bump_generations(GLOBAL_SCOPE, *(get_author_scope(pk) for pk in set(user_pks)))
@@ -0,0 +1,94 @@
+import logging
+from collections import deque
+from datetime import datetime, time, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from audio_library.models import DailyListening, ListeningEvent
+from audio_library.services.counters import WriteBehindBuffer, flusher
+
+logger = logging.getLogger(__name__)
+
+
+class ListeningEventBuffer(WriteBehindBuffer):
+    """
+    Ring buffer of listening events written with bulk_create. When the
+    database falls behind the oldest events are dropped instead of
+    growing the worker's memory.
+    """
+
+    def __init__(self, size: int, batch_size: int):
+        self.size = size
+        self.batch_size = batch_size
+        super().__init__()
+
+    def empty(self) -> deque:
+        return deque(maxlen=self.size)
+
+    def record(self, track_pk: int, kind: str, request=None) -> None:
+        user = getattr(request, "user", None)
+        event = ListeningEvent(
+            track_id=track_pk,
+            user_id=user.pk if user and user.is_authenticated else None,
+            kind=kind,
+            created_at=timezone.now(),
+        )
+        with self._lock:
+            if len(self._pending) == self.size:
+                logger.warning("Listening event buffer is full, dropping oldest")
+            self._pending.append(event)
+        flusher.notify(self)
+
+    def merge(self, batch: deque) -> None:
+        # Put the failed batch back in front of the events recorded since,
+        # appending both in order so a full buffer drops the oldest ones
+        events = deque(batch, maxlen=self.size)
+        events.extend(self._pending)
+        self._pending = events
+
+    def write(self, batch: deque) -> None:
+        ListeningEvent.objects.bulk_create(batch, batch_size=self.batch_size)
+
+
+def compact_listening_events(now: Optional[datetime] = None) -> int:
+    """
+    Fold events older than LISTENING_EVENT_RETENTION_DAYS into DailyListening
+    counts one day at a time, returns the number of compacted days.
+    """
+    now = now or timezone.now()
+    cutoff = timezone.localdate(now) - timedelta(
+        days=settings.LISTENING_EVENT_RETENTION_DAYS
+    )
+    compacted = 0
+    while True:
+        oldest = ListeningEvent.objects.aggregate(oldest=Min("created_at"))["oldest"]
+        if oldest is None or timezone.localdate(oldest) >= cutoff:
+            return compacted
+        day = timezone.localdate(oldest)
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        events = ListeningEvent.objects.filter(
+            created_at__gte=start, created_at__lt=start + timedelta(days=1)
+        )
+        with transaction.atomic():
+            DailyListening.objects.bulk_create(
+                (
+                    DailyListening(day=day, count=row.pop("count"), **row)
+                    for row in events.order_by()
+                    .values("track_id", "user_id", "kind")
+                    .annotate(count=Count("pk"))
+                ),
+                batch_size=1000,
+            )
+            events.delete()
+        compacted += 1
+
+
+listening_events = flusher.register(
+    ListeningEventBuffer(
+        settings.LISTENING_EVENT_BUFFER_SIZE, settings.LISTENING_EVENT_BATCH_SIZE
+    )
+)
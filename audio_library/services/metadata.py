@@ -0,0 +1,142 @@
+import os
+import struct
+from typing import BinaryIO, NamedTuple, Optional
+
+from django.utils import timezone
+
+from audio_library.models import Track
+from audio_library.services.list_cache import bump_author_generations
+
+READ_CHUNK_SIZE = 256 * 1024
+
+# Bitrates in kbps by (MPEG version is 1, layer) and bitrate index
+MPEG_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MPEG_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+
+
+class AudioInfo(NamedTuple):
+    duration: float
+    bitrate: int
+    sample_rate: int
+
+
+class MPEGFrame(NamedTuple):
+    length: int
+    samples: int
+    sample_rate: int
+
+
+def parse_mpeg_frame_header(header: bytes) -> Optional[MPEGFrame]:
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    is_mpeg1 = version == 3
+    bitrate = MPEG_BITRATES[(is_mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    if layer == 1:
+        return MPEGFrame((12 * bitrate // sample_rate + padding) * 4, 384, sample_rate)
+    samples = 1152 if layer == 2 or is_mpeg1 else 576
+    return MPEGFrame(
+        samples // 8 * bitrate // sample_rate + padding, samples, sample_rate
+    )
+
+
+def get_id3v2_size(header: bytes) -> int:
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    return size + (20 if header[5] & 0x10 else 10)
+
+
+def read_mp3_info(file: BinaryIO) -> AudioInfo:
+    """
+    Walk the MPEG frames in one sequential pass over fixed-size chunks,
+    summing up frame sizes and sample counts. Works for CBR and VBR files.
+    """
+    file.seek(get_id3v2_size(file.read(10)))
+    frames_size = samples = 0
+    sample_rate = None
+    buffer = b""
+    while chunk := file.read(READ_CHUNK_SIZE):
+        buffer += chunk
+        position = 0
+        while position + 4 <= len(buffer):
+            frame = parse_mpeg_frame_header(buffer[position : position + 4])
+            if frame is None:
+                next_sync = buffer.find(b"\xff", position + 1)
+                position = next_sync if next_sync != -1 else len(buffer)
+                continue
+            if position + frame.length > len(buffer):
+                break
+            frames_size += frame.length
+            samples += frame.samples
+            sample_rate = sample_rate or frame.sample_rate
+            position += frame.length
+        buffer = buffer[position:]
+
+    if not samples:
+        raise ValueError("No MPEG audio frames found")
+    duration = samples / sample_rate
+    return AudioInfo(duration, round(frames_size * 8 / duration / 1000), sample_rate)
+
+
+def read_wav_info(file: BinaryIO) -> AudioInfo:
+    riff_header = file.read(12)
+    if len(riff_header) < 12 or riff_header[8:12] != b"WAVE":
+        raise ValueError("Not a WAVE file")
+    byte_rate = sample_rate = None
+    while chunk_header := file.read(8):
+        if len(chunk_header) < 8:
+            break
+        chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+        if chunk_id == b"fmt ":
+            fmt = file.read(chunk_size + chunk_size % 2)
+            _, _, sample_rate, byte_rate = struct.unpack("<HHII", fmt[:12])
+        elif chunk_id == b"data" and byte_rate:
+            return AudioInfo(
+                chunk_size / byte_rate, round(byte_rate * 8 / 1000), sample_rate
+            )
+        else:
+            file.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    raise ValueError("WAVE file without fmt or data chunk")
+
+
+def read_audio_info(path: str) -> AudioInfo:
+    with open(path, "rb") as file:
+        magic = file.read(4)
+        file.seek(0)
+        if magic == b"RIFF":
+            return read_wav_info(file)
+        return read_mp3_info(file)
+
+
+def extract_metadata(track: Track) -> None:
+    info = read_audio_info(track.file.path)
+    Track.objects.filter(pk=track.pk).update(
+        duration=info.duration,
+        bitrate=info.bitrate,
+        sample_rate=info.sample_rate,
+        file_size=os.path.getsize(track.file.path),
+        updated_at=timezone.now(),
+    )
+    bump_author_generations(track.user_id)
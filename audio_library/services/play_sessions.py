@@ -0,0 +1,42 @@
+from typing import Optional
+
+from django.conf import settings
+from django.core import signing
+
+PLAY_SESSION_SALT = "audio_library.play_session"
+PLAY_SESSION_HEADER = "X-Play-Session"
+PLAY_SESSION_COOKIE = "play_session"
+
+
+def create_play_session(track_pk: int) -> str:
+    return signing.dumps(track_pk, salt=PLAY_SESSION_SALT)
+
+
+def is_play_session_active(token: Optional[str], track_pk: int) -> bool:
+    if not token:
+        return False
+    try:
+        session_track_pk = signing.loads(
+            token, salt=PLAY_SESSION_SALT, max_age=settings.PLAY_SESSION_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return session_track_pk == track_pk
+
+
+def get_play_session(request) -> Optional[str]:
+    return request.headers.get(PLAY_SESSION_HEADER) or request.COOKIES.get(
+        PLAY_SESSION_COOKIE
+    )
+
+
+def set_play_session(request, response, token: str) -> None:
+    response[PLAY_SESSION_HEADER] = token
+    response.set_cookie(
+        PLAY_SESSION_COOKIE,
+        token,
+        max_age=settings.PLAY_SESSION_MAX_AGE,
+        path=request.path,
+        httponly=True,
+        samesite="Lax",
+    )
@@ -0,0 +1,47 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, List
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+from audio_library.models import Track
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+@lru_cache(maxsize=None)
+def get_track_processors() -> List[Callable[[Track], None]]:
+    return [import_string(path) for path in settings.TRACK_PROCESSORS]
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.TRACK_PROCESSING_WORKERS,
+            thread_name_prefix="track-processing",
+        )
+    return _executor
+
+
+def process_track(track_pk: int) -> None:
+    try:
+        track = Track.objects.filter(pk=track_pk).first()
+        if track is None or not track.file:
+            return
+        for processor in get_track_processors():
+            try:
+                processor(track)
+            except Exception:
+                logger.exception("%s failed for track %s", processor, track_pk)
+    finally:
+        close_old_connections()
+
+
+def schedule_track_processing(track: Track) -> None:
+    transaction.on_commit(lambda: get_executor().submit(process_track, track.pk))
@@ -0,0 +1,217 @@
+import re
+from typing import List, Optional
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Q
+
+from audio_library.models import Track
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def get_search_tokens(query: str) -> List[str]:
+    return TOKEN_RE.findall(query.lower())
+
+
+class SQLiteSearchBackend:
+    """FTS5 table whose rowid is the track id, ranked with weighted bm25."""
+
+    table = "audio_library_track_fts"
+
+    def install(self, cursor) -> None:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            "title, album, author, genres, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def update(self, cursor, pk: int, document: dict) -> None:
+        self.delete(cursor, pk)
+        cursor.execute(
+            f"INSERT INTO {self.table} (rowid, title, album, author, genres) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [
+                pk,
+                document["title"],
+                document["album"],
+                document["author"],
+                document["genres"],
+            ],
+        )
+
+    def delete(self, cursor, pk: int) -> None:
+        cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [pk])
+
+    def clear(self, cursor) -> None:
+        cursor.execute(f"DELETE FROM {self.table}")
+
+    def format_query(self, tokens: List[str]) -> str:
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    def search(self, cursor, tokens: List[str], limit: int, offset: int) -> List[int]:
+        cursor.execute(
+            f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+            f"ORDER BY bm25({self.table}, 10.0, 4.0, 4.0, 2.0) LIMIT %s OFFSET %s",
+            [self.format_query(tokens), limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def count(self, cursor, tokens: List[str]) -> int:
+        cursor.execute(
+            f"SELECT count(*) FROM {self.table} WHERE {self.table} MATCH %s",
+            [self.format_query(tokens)],
+        )
+        return cursor.fetchone()[0]
+
+
+class PostgresSearchBackend:
+    """Weighted tsvector per track behind a GIN index, ranked with ts_rank."""
+
+    table = "audio_library_track_search"
+
+    def install(self, cursor) -> None:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "track_id bigint PRIMARY KEY "
+            "REFERENCES audio_library_track (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_document "
+            f"ON {self.table} USING gin (document)"
+        )
+
+    def update(self, cursor, pk: int, document: dict) -> None:
+        cursor.execute(
+            f"INSERT INTO {self.table} (track_id, document) VALUES (%s, "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s), 'B') || "
+            "setweight(to_tsvector('simple', %s), 'B') || "
+            "setweight(to_tsvector('simple', %s), 'C')) "
+            "ON CONFLICT (track_id) DO UPDATE SET document = EXCLUDED.document",
+            [
+                pk,
+                document["title"],
+                document["album"],
+                document["author"],
+                document["genres"],
+            ],
+        )
+
+    def delete(self, cursor, pk: int) -> None:
+        cursor.execute(f"DELETE FROM {self.table} WHERE track_id = %s", [pk])
+
+    def clear(self, cursor) -> None:
+        cursor.execute(f"TRUNCATE {self.table}")
+
+    def format_query(self, tokens: List[str]) -> str:
+        return " & ".join(f"{token}:*" for token in tokens)
+
+    def search(self, cursor, tokens: List[str], limit: int, offset: int) -> List[int]:
+        cursor.execute(
+            f"SELECT track_id FROM {self.table}, to_tsquery('simple', %s) query "
+            "WHERE document @@ query ORDER BY ts_rank(document, query) DESC, "
+            "track_id DESC LIMIT %s OFFSET %s",
+            [self.format_query(tokens), limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def count(self, cursor, tokens: List[str]) -> int:
+        cursor.execute(
+            f"SELECT count(*) FROM {self.table} "
+            "WHERE document @@ to_tsquery('simple', %s)",
+            [self.format_query(tokens)],
+        )
+        return cursor.fetchone()[0]
+
+
+SEARCH_BACKENDS = {
+    "sqlite": SQLiteSearchBackend(),
+    "postgresql": PostgresSearchBackend(),
+}
+
+
+def get_search_backend():
+    try:
+        return SEARCH_BACKENDS[connection.vendor]
+    except KeyError:
+        raise ImproperlyConfigured(f"No track search backend for {connection.vendor}")
+
+
+def install_search_index(**kwargs) -> None:
+    with connection.cursor() as cursor:
+        get_search_backend().install(cursor)
+
+
+def is_searchable(track: Track) -> bool:
+    return not (
+        track.is_deleted or track.private or (track.album and track.album.private)
+    )
+
+
+def get_search_document(track: Track) -> dict:
+    return {
+        "title": track.title,
+        "album": track.album.name if track.album else "",
+        "author": track.user.username or "",
+        "genres": " ".join(genre.name for genre in track.genre.all()),
+    }
+
+
+def index_track(track: Track) -> None:
+    """Bring the track's search entry in line with its current state."""
+    backend = get_search_backend()
+    with connection.cursor() as cursor:
+        if is_searchable(track):
+            backend.update(cursor, track.pk, get_search_document(track))
+        else:
+            backend.delete(cursor, track.pk)
+
+
+def index_tracks(queryset) -> None:
+    queryset = queryset.select_related("album", "user").prefetch_related("genre")
+    for track in queryset.iterator(chunk_size=500):
+        index_track(track)
+
+
+def rebuild_search_index() -> None:
+    backend = get_search_backend()
+    with connection.cursor() as cursor:
+        backend.install(cursor)
+        backend.clear(cursor)
+    index_tracks(Track.objects.all())
+
+
+def unindex_track(pk: int) -> None:
+    with connection.cursor() as cursor:
+        get_search_backend().delete(cursor, pk)
+
+
+class SearchResults:
+    """Ranked tracks matching `query`, sliced lazily for the paginator."""
+
+    def __init__(self, query: str):
+        self.tokens = get_search_tokens(query)
+        self._count: Optional[int] = None
+
+    def count(self) -> int:
+        if self._count is None:
+            with connection.cursor() as cursor:
+                self._count = get_search_backend().count(cursor, self.tokens)
+        return self._count
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, item: slice) -> List[Track]:
+        start = item.start or 0
+        with connection.cursor() as cursor:
+            pks = get_search_backend().search(
+                cursor, self.tokens, item.stop - start, start
+            )
+        tracks = (
+            Track.objects.filter(Q(album=None) | Q(album__private=False), private=False)
+            .with_related()
+            .in_bulk(pks)
+        )
+        return [tracks[pk] for pk in pks if pk in tracks]
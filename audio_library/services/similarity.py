@@ -0,0 +1,101 @@
+from typing import List, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from scipy import sparse
+
+from audio_library.models import PlayList, SimilarTrack, Track
+from audio_library.services.likes import TrackLike
+
+
+def get_pairs(queryset, basket_field: str) -> np.ndarray:
+    pairs = queryset.values_list(basket_field, "track_id").order_by()
+    return np.array(list(pairs), dtype=np.int64).reshape(-1, 2)
+
+
+def build_cooccurrence(*pair_sets: np.ndarray) -> Tuple[np.ndarray, sparse.csr_matrix]:
+    """
+    Cosine similarity of tracks from `(basket, track)` pairs, each pair set
+    with its own basket ids. Returns the track pks and the track x track
+    matrix with an empty diagonal.
+    """
+    rows, cols, baskets = [], [], 0
+    for pairs in pair_sets:
+        basket_pks, basket_index = np.unique(pairs[:, 0], return_inverse=True)
+        rows.append(basket_index + baskets)
+        cols.append(pairs[:, 1])
+        baskets += len(basket_pks)
+    track_pks, track_index = np.unique(np.concatenate(cols), return_inverse=True)
+    occurrence = sparse.csr_matrix(
+        (
+            np.ones(len(track_index), dtype=np.float32),
+            (np.concatenate(rows), track_index),
+        ),
+        shape=(baskets, len(track_pks)),
+    )
+    occurrence.data[:] = 1
+    cooccurrence = (occurrence.T @ occurrence).tocsr()
+    norm = sparse.diags(1 / np.sqrt(cooccurrence.diagonal()))
+    similarity = (norm @ cooccurrence @ norm).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+    return track_pks, similarity
+
+
+def get_top_neighbours(
+    track_pks: np.ndarray, similarity: sparse.csr_matrix, count: int
+) -> List[SimilarTrack]:
+    rows = []
+    for row in range(similarity.shape[0]):
+        start, end = similarity.indptr[row], similarity.indptr[row + 1]
+        scores = similarity.data[start:end]
+        neighbours = track_pks[similarity.indices[start:end]]
+        # Highest score first, the older track wins a tie
+        top = np.lexsort((neighbours, -scores))[:count]
+        rows.extend(
+            SimilarTrack(
+                track_id=int(track_pks[row]),
+                similar_id=int(neighbours[index]),
+                rank=rank,
+                score=float(scores[index]),
+            )
+            for rank, index in enumerate(top, start=1)
+        )
+    return rows
+
+
+def build_similar_tracks() -> int:
+    """
+    Rebuild the SIMILAR_TRACKS_COUNT nearest neighbours of every track from
+    how often tracks share a playlist or a listener's likes. Only public
+    tracks are suggested. Returns the number of stored rows.
+    """
+    pair_sets = [
+        pairs
+        for pairs in (
+            get_pairs(
+                PlayList.track.through.objects.filter(playlist__is_deleted=False),
+                "playlist_id",
+            ),
+            get_pairs(TrackLike.objects.all(), "user_id"),
+        )
+        if len(pairs)
+    ]
+    rows = []
+    if pair_sets:
+        track_pks, similarity = build_cooccurrence(*pair_sets)
+        visible = Track.objects.filter(
+            Q(album=None) | Q(album__private=False),
+            pk__in=track_pks.tolist(),
+            private=False,
+        ).values_list("pk", flat=True)
+        mask = np.isin(track_pks, list(visible)).astype(np.float32)
+        similarity = (similarity @ sparse.diags(mask)).tocsr()
+        similarity.eliminate_zeros()
+        rows = get_top_neighbours(track_pks, similarity, settings.SIMILAR_TRACKS_COUNT)
+    with transaction.atomic():
+        SimilarTrack.objects.all().delete()
+        SimilarTrack.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
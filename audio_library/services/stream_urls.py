@@ -0,0 +1,37 @@
+import base64
+import hashlib
+import hmac
+import time
+from typing import Optional, Tuple
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+
+
+def get_secure_link_hash(uri: str, expires: int) -> str:
+    """
+    Same value nginx computes for
+    `secure_link_md5 "$secure_link_expires$uri $secret"`.
+    """
+    secret_string = f"{expires}{uri} {settings.STREAM_URL_SECRET}"
+    digest = hashlib.md5(secret_string.encode("utf-8")).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def sign_stream_url(name: str, now: Optional[int] = None) -> Tuple[str, int]:
+    expires = int(now if now is not None else time.time()) + settings.STREAM_URL_TTL
+    uri = f"{settings.STREAM_URL_PREFIX}{name}"
+    query = urlencode({"md5": get_secure_link_hash(uri, expires), "expires": expires})
+    return f"{quote(uri)}?{query}", expires
+
+
+def verify_stream_url(
+    uri: str, md5: str, expires: str, now: Optional[int] = None
+) -> bool:
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < int(now if now is not None else time.time()):
+        return False
+    return hmac.compare_digest(get_secure_link_hash(uri, expires), md5 or "")
@@ -0,0 +1,124 @@
+import mimetypes
+import os
+import re
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+
+RANGE_HEADER_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Return the inclusive (start, end) byte positions requested by a single
+    `Range` header, or None when the whole file has to be sent. Multiple and
+    malformed ranges are ignored, as RFC 9110 allows.
+    """
+    match = RANGE_HEADER_RE.match(header.strip()) if header else None
+    if match is None or match.groups() == ("", ""):
+        return None
+
+    start, end = match.groups()
+    if not start:
+        suffix_length = int(end)
+        if suffix_length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - suffix_length, 0), size - 1
+
+    start = int(start)
+    if end and start > int(end):
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+
+class RangeFile:
+    """
+    File object limited to `length` bytes from `start`. It deliberately has
+    no `fileno`: gunicorn 20's `wsgi.file_wrapper` would sendfile from offset
+    0 instead of `start`, so the range is read in blocks. Whole files are
+    served from the plain file object, which can be sendfiled.
+    """
+
+    def __init__(self, path: str, start: int, length: int):
+        self.file = open(path, "rb")
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def range_file_response(
+    request, path: str, content_type: str, size: Optional[int] = None
+) -> HttpResponse:
+    if size is None:
+        size = os.path.getsize(path)
+    try:
+        byte_range = parse_range_header(request.headers.get("Range"), size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    if byte_range:
+        file = RangeFile(path, start, length)
+    else:
+        file = open(path, "rb")
+    response = FileResponse(
+        file,
+        content_type=content_type,
+        status=206 if byte_range else 200,
+    )
+    response["Content-Length"] = str(length)
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def media_file_response(
+    request,
+    name: str,
+    accel_location: str,
+    attachment: bool = False,
+    size: Optional[int] = None,
+    file_name: Optional[str] = None,
+) -> HttpResponse:
+    """
+    Serve a stored media file either through nginx (`X-Accel-Redirect` to
+    `accel_location`) or, with STREAMING_BACKEND = "native", from the worker.
+    A known `size` saves the stat call of the native backend. Attachments
+    are offered as `file_name`, else under the stored name.
+    """
+    content_type = mimetypes.guess_type(name)[0] or "audio/mpeg"
+    if settings.STREAMING_BACKEND == "native":
+        response = range_file_response(
+            request, default_storage.path(name), content_type, size
+        )
+    else:
+        response = HttpResponse("", content_type=content_type)
+        response["X-Accel-Redirect"] = f"{accel_location}{name}"
+    if attachment:
+        response["Content-Disposition"] = content_disposition_header(
+            True, file_name or os.path.basename(name)
+        )
+    return response
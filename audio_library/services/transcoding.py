@@ -0,0 +1,117 @@
+import logging
+import multiprocessing
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from core.services import get_path_track_rendition
+
+logger = logging.getLogger(__name__)
+
+CLIENT_HINTS = ("Save-Data", "ECT", "Downlink")
+EFFECTIVE_CONNECTION_BITRATES = {"slow-2g": 32, "2g": 64, "3g": 128}
+
+_pool = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    # Pool processes are spawned, so this module must stay importable
+    # without the Django app registry.
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.TRANSCODING_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def encode_rendition(ffmpeg: str, source: str, destination: str, bitrate: int):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    part = f"{destination}.part"
+    subprocess.run(
+        [
+            ffmpeg,
+            "-y",
+            "-loglevel",
+            "error",
+            "-i",
+            source,
+            "-vn",
+            "-map_metadata",
+            "-1",
+            "-c:a",
+            "libmp3lame",
+            "-b:a",
+            f"{bitrate}k",
+            "-f",
+            "mp3",
+            part,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    os.replace(part, destination)
+
+
+def transcode_track(track) -> None:
+    futures = {}
+    for quality, bitrate in settings.TRACK_RENDITIONS.items():
+        name = get_path_track_rendition(track, quality)
+        futures[quality] = name, get_pool().submit(
+            encode_rendition,
+            settings.FFMPEG_BINARY,
+            track.file.path,
+            default_storage.path(name),
+            bitrate,
+        )
+
+    renditions = {}
+    for quality, (name, future) in futures.items():
+        try:
+            future.result()
+        except Exception:
+            logger.exception("Couldn't encode %s rendition of %s", quality, track.pk)
+        else:
+            renditions[quality] = name
+    type(track).objects.filter(pk=track.pk).update(renditions=renditions)
+
+
+def get_bitrate_budget(request) -> Optional[int]:
+    if request.headers.get("Save-Data", "").lower() == "on":
+        return 0
+    budget = EFFECTIVE_CONNECTION_BITRATES.get(request.headers.get("ECT", "").lower())
+    try:
+        downlink = float(request.headers["Downlink"])
+    except (KeyError, ValueError):
+        return budget
+    # Leave half of the measured downlink (Mbps) for buffering ahead
+    downlink_budget = int(downlink * 1000 / 2)
+    return downlink_budget if budget is None else min(budget, downlink_budget)
+
+
+def choose_rendition(request, track) -> str:
+    """
+    Storage name of the file to stream: the rendition asked for with the
+    `quality` parameter, else the best one fitting the client hints, else
+    the original upload.
+    """
+    renditions = track.renditions or {}
+    quality = request.GET.get("quality")
+    if quality is not None:
+        return renditions.get(quality, track.file.name)
+
+    budget = get_bitrate_budget(request)
+    available = sorted(
+        (bitrate, quality)
+        for quality, bitrate in settings.TRACK_RENDITIONS.items()
+        if quality in renditions
+    )
+    if budget is None or not available:
+        return track.file.name
+    fitting = [quality for bitrate, quality in available if bitrate <= budget]
+    return renditions[fitting[-1] if fitting else available[0][1]]
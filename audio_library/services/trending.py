@@ -0,0 +1,143 @@
+import heapq
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from audio_library.models import TrackPlayBucket, Track, TrendingTrack
+from audio_library.services.counters import WriteBehindBuffer, flusher
+
+logger = logging.getLogger(__name__)
+
+BUCKET_RETENTION = timedelta(days=7)
+REFRESH_LOCK_KEY = "trending:refresh"
+
+
+def get_bucket_start(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class PlayBucketBuffer(WriteBehindBuffer):
+    """Plays counted per track into hourly buckets."""
+
+    def empty(self) -> Counter:
+        return Counter()
+
+    def add(self, track_pk: int, moment: Optional[datetime] = None) -> None:
+        start = get_bucket_start(moment or timezone.now())
+        with self._lock:
+            self._pending[(track_pk, TrackPlayBucket.HOUR, start)] += 1
+        flusher.notify(self)
+
+    def merge(self, batch: Counter) -> None:
+        self._pending.update(batch)
+
+    def write(self, batch: Counter) -> None:
+        with transaction.atomic():
+            for (track_pk, period, start), plays in sorted(batch.items()):
+                bucket = TrackPlayBucket.objects.filter(
+                    track_id=track_pk, period=period, start=start
+                )
+                if bucket.update(plays=F("plays") + plays):
+                    continue
+                try:
+                    with transaction.atomic():
+                        TrackPlayBucket.objects.create(
+                            track_id=track_pk, period=period, start=start, plays=plays
+                        )
+                except IntegrityError:
+                    # Created meanwhile by another worker
+                    bucket.update(plays=F("plays") + plays)
+        trending_refresher.pending.set()
+
+
+def get_trending_scores(now: datetime) -> dict:
+    """Hourly plays of the window, each halved every TRENDING_HALF_LIFE_HOURS."""
+    window_start = now - timedelta(hours=settings.TRENDING_WINDOW_HOURS)
+    buckets = TrackPlayBucket.objects.filter(
+        period=TrackPlayBucket.HOUR, start__gte=window_start
+    ).values_list("track_id", "start", "plays")
+    scores = defaultdict(float)
+    for track_pk, start, plays in buckets.iterator():
+        age = (now - start).total_seconds() / 3600
+        scores[track_pk] += plays * 0.5 ** (age / settings.TRENDING_HALF_LIFE_HOURS)
+    return scores
+
+
+def refresh_trending_charts(now: Optional[datetime] = None) -> None:
+    """
+    Rebuild the top TRENDING_CHART_SIZE tracks overall and per genre from the
+    buckets of the trending window, so only recently played tracks are read.
+
+    The scores are recomputed rather than updated: every score decays each
+    hour and plays leave the window, so an update would re-read as many
+    buckets. The refresh runs in one worker's flusher thread at most every
+    TRENDING_REFRESH_INTERVAL seconds, and reads at most one row per played
+    track and hour of the window.
+    """
+    now = now or timezone.now()
+    scores = get_trending_scores(now)
+    tracks = (
+        Track.objects.filter(Q(album=None) | Q(album__private=False), private=False)
+        .filter(pk__in=list(scores))
+        .prefetch_related("genre")
+    )
+    by_genre = defaultdict(list)
+    for track in tracks:
+        by_genre[None].append(track.pk)
+        for genre in track.genre.all():
+            by_genre[genre.pk].append(track.pk)
+
+    rows = []
+    for genre_pk, track_pks in by_genre.items():
+        top = heapq.nlargest(
+            settings.TRENDING_CHART_SIZE, track_pks, key=lambda pk: (scores[pk], pk)
+        )
+        rows.extend(
+            TrendingTrack(genre_id=genre_pk, track_id=pk, rank=rank, score=scores[pk])
+            for rank, pk in enumerate(top, start=1)
+        )
+    with transaction.atomic():
+        TrendingTrack.objects.all().delete()
+        TrendingTrack.objects.bulk_create(rows)
+    TrackPlayBucket.objects.filter(start__lt=now - BUCKET_RETENTION).delete()
+
+
+class TrendingRefresher:
+    """
+    Refreshes the charts from the background flusher at most every
+    `interval` seconds after new plays were written. A cache lock lets only
+    one worker process do each refresh.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.pending = threading.Event()
+        self._refreshed_at = 0.0
+
+    def flush(self) -> None:
+        now = time.monotonic()
+        if not self.pending.is_set() or now - self._refreshed_at < self.interval:
+            return
+        self.pending.clear()
+        self._refreshed_at = now
+        if not cache.add(REFRESH_LOCK_KEY, True, timeout=self.interval):
+            return
+        try:
+            refresh_trending_charts()
+        except Exception:
+            logger.exception("Couldn't refresh trending charts")
+
+
+play_buckets = flusher.register(PlayBucketBuffer())
+trending_refresher = flusher.register(
+    TrendingRefresher(settings.TRENDING_REFRESH_INTERVAL)
+)
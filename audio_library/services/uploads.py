@@ -0,0 +1,127 @@
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from audio_library.models import UploadSession
+
+UPLOAD_DIR = "uploads"
+UPLOAD_SUFFIX = ".part"
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class ChunkOutOfRange(Exception):
+    pass
+
+
+class ChunkSizeMismatch(Exception):
+    pass
+
+
+class UploadedChunksFile(File):
+    """The assembled upload, moved into storage instead of being copied."""
+
+    def temporary_file_path(self) -> str:
+        return self.file.name
+
+
+def get_upload_path(session) -> str:
+    return default_storage.path(
+        os.path.join(UPLOAD_DIR, f"{session.pk}{UPLOAD_SUFFIX}")
+    )
+
+
+def get_chunk_count(session) -> int:
+    return math.ceil(session.size / session.chunk_size)
+
+
+def get_chunk_length(session, index: int) -> int:
+    return min(session.chunk_size, session.size - index * session.chunk_size)
+
+
+def get_missing_chunks(session) -> list:
+    received = set(session.chunks.values_list("index", flat=True))
+    return [index for index in range(get_chunk_count(session)) if index not in received]
+
+
+def allocate_upload(session) -> None:
+    path = get_upload_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.truncate(session.size)
+
+
+def write_chunk(session, index: int, stream) -> None:
+    """Write one chunk from `stream` at its offset of the preallocated file."""
+    if not 0 <= index < get_chunk_count(session):
+        raise ChunkOutOfRange
+    length = get_chunk_length(session, index)
+    offset = index * session.chunk_size
+
+    written = 0
+    fd = os.open(get_upload_path(session), os.O_WRONLY)
+    try:
+        while written < length:
+            data = (
+                stream.read(min(COPY_BUFFER_SIZE, length - written)) if stream else b""
+            )
+            if not data:
+                break
+            view = memoryview(data)
+            while view:
+                count = os.pwrite(fd, view, offset + written)
+                view = view[count:]
+                written += count
+    finally:
+        os.close(fd)
+    if written != length or (stream and stream.read(1)):
+        raise ChunkSizeMismatch
+    session.chunks.get_or_create(index=index)
+
+
+def open_upload(session) -> UploadedChunksFile:
+    return UploadedChunksFile(open(get_upload_path(session), "rb"), session.file_name)
+
+
+def discard_upload(session) -> None:
+    try:
+        os.remove(get_upload_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def expire_upload_sessions(now: Optional[datetime] = None) -> int:
+    """
+    Delete sessions older than UPLOAD_SESSION_TTL_HOURS together with their
+    files, and `.part` files of that age no session refers to any more.
+    Returns the number of removed sessions.
+    """
+    cutoff = (now or timezone.now()) - timedelta(
+        hours=settings.UPLOAD_SESSION_TTL_HOURS
+    )
+    expired = 0
+    for session in UploadSession.objects.filter(created_at__lt=cutoff).iterator():
+        discard_upload(session)
+        UploadSession.objects.filter(pk=session.pk).delete()
+        expired += 1
+
+    upload_dir = default_storage.path(UPLOAD_DIR)
+    if not os.path.isdir(upload_dir):
+        return expired
+    live = {
+        f"{pk}{UPLOAD_SUFFIX}"
+        for pk in UploadSession.objects.values_list("pk", flat=True)
+    }
+    for entry in os.scandir(upload_dir):
+        if (
+            entry.name.endswith(UPLOAD_SUFFIX)
+            and entry.name not in live
+            and entry.stat().st_mtime < cutoff.timestamp()
+        ):
+            os.remove(entry.path)
+    return expired
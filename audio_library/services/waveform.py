@@ -0,0 +1,92 @@
+import os
+import subprocess
+from typing import Iterable, Iterator
+
+import numpy as np
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from audio_library.models import Track
+from core.services import get_path_track_waveform
+
+WAVEFORM_SAMPLE_RATE = 8000
+WAVEFORM_BLOCK_SIZE = 64
+WAVEFORM_DTYPE = np.int8
+
+
+def decode_samples(path: str, chunk_size: int = 64 * 1024) -> Iterator[np.ndarray]:
+    process = subprocess.Popen(
+        [
+            settings.FFMPEG_BINARY,
+            "-loglevel",
+            "error",
+            "-i",
+            path,
+            "-vn",
+            "-ac",
+            "1",
+            "-ar",
+            str(WAVEFORM_SAMPLE_RATE),
+            "-f",
+            "s16le",
+            "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    rest = b""
+    with process.stdout:
+        while chunk := process.stdout.read(chunk_size):
+            chunk = rest + chunk
+            even_size = len(chunk) - len(chunk) % 2
+            rest = chunk[even_size:]
+            yield np.frombuffer(chunk[:even_size], dtype="<i2")
+    if process.wait():
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+
+
+def compute_peaks(chunks: Iterable[np.ndarray], resolution: int) -> np.ndarray:
+    """
+    Reduce 16-bit samples to `resolution` absolute peaks scaled to int8.
+    Samples are first folded into per-block maxima chunk by chunk, so only
+    the block peaks of the whole track are kept in memory.
+    """
+    block_peaks = []
+    rest = np.empty(0, dtype=np.int32)
+    for chunk in chunks:
+        samples = np.concatenate((rest, np.abs(chunk.astype(np.int32))))
+        full_size = len(samples) - len(samples) % WAVEFORM_BLOCK_SIZE
+        rest = samples[full_size:]
+        if full_size:
+            block_peaks.append(
+                samples[:full_size].reshape(-1, WAVEFORM_BLOCK_SIZE).max(axis=1)
+            )
+    if len(rest):
+        block_peaks.append(rest.max(keepdims=True))
+    if not block_peaks:
+        return np.zeros(resolution, dtype=WAVEFORM_DTYPE)
+
+    block_peaks = np.concatenate(block_peaks)
+    edges = np.linspace(0, len(block_peaks), resolution, endpoint=False).astype(int)
+    peaks = np.maximum.reduceat(block_peaks, edges)
+    return (np.minimum(peaks, 32767) * 127 // 32767).astype(WAVEFORM_DTYPE)
+
+
+def extract_waveform(track: Track) -> None:
+    resolution = max(settings.WAVEFORM_RESOLUTIONS)
+    peaks = compute_peaks(decode_samples(track.file.path), resolution)
+    path = default_storage.path(get_path_track_waveform(track))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.part", "wb") as peaks_file:
+        peaks.tofile(peaks_file)
+    os.replace(f"{path}.part", path)
+
+
+def load_waveform(track: Track, resolution: int) -> np.ndarray:
+    """
+    Peaks of the stored waveform downsampled to `resolution`, which has to
+    divide the stored resolution.
+    """
+    path = default_storage.path(get_path_track_waveform(track))
+    peaks = np.fromfile(path, dtype=WAVEFORM_DTYPE)
+    return peaks.reshape(resolution, -1).max(axis=1)
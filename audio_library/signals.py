@@ -0,0 +1,185 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from audio_library.models import Album, Comment, Genre, License, Track
+from audio_library.services.feed import follow_changed, schedule_fan_out
+from audio_library.services.search import index_track, index_tracks, unindex_track
+from audio_library.services.list_cache import (
+    GENRES_SCOPE,
+    GLOBAL_SCOPE,
+    bump_author_generations,
+    bump_generations,
+    get_comments_scope,
+)
+from users.models import Follower, SocialLink, User
+from users.serializers.base_serializers import AuthorSerializer
+
+# User fields shown wherever an author is nested
+AUTHOR_FIELDS = [
+    name
+    for name in AuthorSerializer.Meta.fields
+    if name != "id" and name in {field.name for field in User._meta.concrete_fields}
+]
+
+
+@receiver([post_save, post_delete], sender=Track)
+@receiver([post_save, post_delete], sender=Album)
+def author_content_changed(sender, instance, **kwargs):
+    bump_author_generations(instance.user_id)
+
+
+def has_listed_tracks(**filters) -> bool:
+    return Track.objects.filter(private=False, **filters).exists()
+
+
+@receiver([post_save, post_delete], sender=License)
+def license_changed(sender, instance, **kwargs):
+    bump_author_generations(
+        instance.user_id, listed=has_listed_tracks(license_id=instance.pk)
+    )
+
+
+def bump_commenter_generations(user_pk: int) -> None:
+    # Comments embed their author, so their tracks' comment lists change too
+    track_pks = (
+        Comment.objects.filter(user_id=user_pk)
+        .values_list("track_id", flat=True)
+        .distinct()
+    )
+    scopes = [get_comments_scope(pk) for pk in track_pks]
+    if scopes:
+        bump_generations(*scopes)
+
+
+def get_author_value(value):
+    # Files compare by name, a blank one the same as a missing one
+    return getattr(value, "name", value) or None
+
+
+def get_changed_author_fields(instance, update_fields) -> set:
+    """Fields AuthorSerializer shows that the save changes."""
+    if instance._state.adding:
+        # Nothing lists a new user yet
+        return set()
+    fields = [
+        name for name in AUTHOR_FIELDS if update_fields is None or name in update_fields
+    ]
+    if not fields:
+        return set()
+    saved = User.objects.filter(pk=instance.pk).values(*fields).first()
+    if saved is None:
+        return set(fields)
+    return {
+        name
+        for name in fields
+        if get_author_value(saved[name]) != get_author_value(getattr(instance, name))
+    }
+
+
+@receiver(pre_save, sender=User)
+def check_author_changed(sender, instance, update_fields=None, **kwargs):
+    changed = get_changed_author_fields(instance, update_fields)
+    instance._author_changed = bool(changed)
+    # The search document has the author's username only
+    instance._username_changed = "username" in changed
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, **kwargs):
+    if getattr(instance, "_author_changed", True):
+        bump_author_generations(
+            instance.pk, listed=has_listed_tracks(user_id=instance.pk)
+        )
+        bump_commenter_generations(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def author_deleted(sender, instance, **kwargs):
+    bump_author_generations(instance.pk)
+    bump_commenter_generations(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=SocialLink)
+def social_link_changed(sender, instance, **kwargs):
+    bump_author_generations(
+        instance.user_id, listed=has_listed_tracks(user_id=instance.user_id)
+    )
+    bump_commenter_generations(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump_generations(get_comments_scope(instance.track_id))
+
+
+@receiver([post_save, post_delete], sender=Genre)
+def genre_changed(sender, instance, **kwargs):
+    bump_generations(GLOBAL_SCOPE, GENRES_SCOPE)
+
+
+@receiver(m2m_changed, sender=Track.genre.through)
+def track_genres_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        bump_generations(GLOBAL_SCOPE, GENRES_SCOPE)
+    else:
+        bump_author_generations(instance.user_id)
+
+
+@receiver(post_save, sender=Track)
+def index_saved_track(sender, instance, **kwargs):
+    index_track(instance)
+
+
+@receiver(post_delete, sender=Track)
+def unindex_deleted_track(sender, instance, **kwargs):
+    unindex_track(instance.pk)
+
+
+@receiver(post_save, sender=Album)
+def index_album_tracks(sender, instance, **kwargs):
+    index_tracks(instance.track_set.all())
+
+
+@receiver(post_save, sender=Genre)
+def index_genre_tracks(sender, instance, **kwargs):
+    index_tracks(instance.tracks_genre.all())
+
+
+@receiver(post_save, sender=User)
+def index_author_tracks(sender, instance, created, **kwargs):
+    if not created and getattr(instance, "_username_changed", True):
+        index_tracks(instance.tracks.all())
+
+
+@receiver(m2m_changed, sender=Track.genre.through)
+def index_track_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # The cleared tracks can't be looked up any more after the clear
+        instance._cleared_track_pks = list(
+            instance.tracks_genre.values_list("pk", flat=True)
+        )
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        index_track(instance)
+    else:
+        pks = pk_set if pk_set is not None else instance._cleared_track_pks
+        index_tracks(Track.objects.filter(pk__in=pks))
+
+
+@receiver(post_save, sender=Track)
+def fan_out_saved_track(sender, instance, **kwargs):
+    schedule_fan_out(instance)
+
+
+@receiver(post_save, sender=Follower)
+def follower_added(sender, instance, created, **kwargs):
+    if created:
+        follow_changed(instance, 1)
+
+
+@receiver(post_delete, sender=Follower)
+def follower_removed(sender, instance, **kwargs):
+    follow_changed(instance, -1)
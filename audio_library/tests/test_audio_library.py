@@ -1,14 +1,154 @@
+import hashlib
+from datetime import timedelta
+import os
+import shutil
+
+import io
+import socket
+import tempfile
+import time
+import unittest
+import wave
+
+import numpy as np
+from PIL import Image
+
+from django.core.cache import cache
 from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
 
 from django.shortcuts import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from audio_library.models import Genre
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import (
+    IntegrityError,
+    InterfaceError,
+    close_old_connections,
+    connection,
+    transaction,
+)
+from django.test import override_settings, RequestFactory
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from concurrent.futures import Future
+from gunicorn.config import Config
+from gunicorn.http.wsgi import FileWrapper, Response as GunicornResponse
+from unittest import mock
+from urllib.parse import urlsplit, parse_qs, unquote
+from django.core.management import call_command
+from audio_library.models import (
+    Album,
+    DailyListening,
+    FeedItem,
+    FileDeletion,
+    Genre,
+    ListeningEvent,
+    MediaBlob,
+    Track,
+    TrackPlayBucket,
+    UploadSession,
+)
+from audio_library.classes import FeedPagination, KeysetPagination, Pagination
+from core.storage import media_storage
+from core.thumbnails import THUMBNAIL_DIR, ThumbnailCache
+from core.services import (
+    get_path_track_hls,
+    get_path_track_media,
+    get_path_track_waveform,
+)
+from audio_library.services import counters
+from audio_library.services.counters import (
+    BackgroundFlusher,
+    CounterListBumper,
+    flusher,
+    track_counters,
+    TrackCounterBuffer,
+)
+from audio_library.services.list_cache import GLOBAL_SCOPE, MODIFIED_KEY
+from audio_library.services.play_sessions import create_play_session
+from audio_library.services.stream_urls import sign_stream_url, verify_stream_url
+from audio_library.services.metadata import extract_metadata, read_audio_info
+from audio_library.services.hls import get_hls_manifest_name, segment_track
+from audio_library.services.processing import process_track
+from audio_library.services.autocomplete import AutocompleteIndex
+from audio_library.services.deletion import soft_delete
+from audio_library.services.similarity import build_similar_tracks
+from audio_library.services.listening import (
+    compact_listening_events,
+    ListeningEventBuffer,
+    listening_events,
+)
+from audio_library.services.trending import (
+    play_buckets,
+    refresh_trending_charts,
+    trending_refresher,
+)
+from audio_library.services.uploads import (
+    discard_upload,
+    expire_upload_sessions,
+    get_upload_path,
+)
+from audio_library.services.transcoding import choose_rendition, transcode_track
+from audio_library.services.waveform import (
+    compute_peaks,
+    extract_waveform,
+    load_waveform,
+)
+from audio_library.services.streaming import (
+    parse_range_header,
+    RangeNotSatisfiable,
+)
+
+from users.models import Follower
 
 User = get_user_model()
 
 
+def setUpModule():
+    # Stored files are removed on commit, which tests never reach
+    media_root = tempfile.mkdtemp()
+    os.makedirs(os.path.join(media_root, "uploads"))
+    media_settings = override_settings(
+        MEDIA_ROOT=media_root,
+        FILE_UPLOAD_TEMP_DIR=os.path.join(media_root, "uploads"),
+    )
+    media_settings.enable()
+    unittest.addModuleCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    unittest.addModuleCleanup(media_settings.disable)
+
+
+def assert_query_budget(test_case, budget, url, **kwargs):
+    """GET `url` and fail if it needs more than `budget` queries."""
+    with CaptureQueriesContext(connection) as context:
+        response = test_case.client.get(url, **kwargs)
+    test_case.assertLessEqual(
+        len(context.captured_queries),
+        budget,
+        "\n".join(query["sql"] for query in context.captured_queries),
+    )
+    return response
+
+
+def pause_counters_flusher(test_case):
+    flusher_patcher = mock.patch(
+        "audio_library.services.counters.flusher.ensure_started"
+    )
+    flusher_patcher.start()
+    test_case.addCleanup(flusher_patcher.stop)
+    lists_patcher = mock.patch.object(counters, "counter_lists", CounterListBumper(60))
+    lists_patcher.start()
+    test_case.addCleanup(lists_patcher.stop)
+    test_case.addCleanup(track_counters.take)
+    test_case.addCleanup(play_buckets.take)
+    test_case.addCleanup(listening_events.take)
+    test_case.addCleanup(trending_refresher.pending.clear)
+
+
 class GenreAPIViewTest(APITestCase):
     def setUp(self) -> None:
         Genre.objects.create(name="Rock")
@@ -31,6 +171,7 @@ class GenreAPIViewTest(APITestCase):
 
 class StreamingTrackAPIViewTest(APITestCase):
     def setUp(self):
+        pause_counters_flusher(self)
         self.user = User.objects.create_user(
             email="test@gmail.com", password="12345678test"
         )
@@ -49,6 +190,64 @@ class StreamingTrackAPIViewTest(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.track.refresh_from_db()
+        self.assertEqual(self.track.auditions, 0)
+        track_counters.flush()
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.auditions, 1)
+
+    def test_counter_flush_invalidates_track_list_in_time(self):
+        list_url = reverse("track_list")
+        author_url = reverse("author_track_list", args=[self.user.pk])
+        etag = self.client.get(list_url)["ETag"]
+        self.client.get(author_url)
+        self.client.get(reverse("stream_track", kwargs={"pk": self.track.pk}))
+        track_counters.flush()
+        counters.counter_lists.flush()
+
+        # The global list was bumped by the track's save moments ago
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(author_url).data["results"][0]["auditions"], 1)
+
+        cache.set(MODIFIED_KEY.format(GLOBAL_SCOPE), int(time.time()) - 60)
+        counters.counter_lists.flush()
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["auditions"], 1)
+
+    def test_range_requests_of_play_session_count_once(self):
+        url = reverse("stream_track", kwargs={"pk": self.track.pk})
+        response = self.client.get(url)
+        play_session = response["X-Play-Session"]
+        self.client.cookies.clear()
+        for _ in range(3):
+            response = self.client.get(
+                url, HTTP_RANGE="bytes=100-", HTTP_X_PLAY_SESSION=play_session
+            )
+            self.assertNotIn("X-Play-Session", response)
+
+        track_counters.flush()
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.auditions, 1)
+
+    def test_play_session_cookie_counts_once(self):
+        url = reverse("stream_track", kwargs={"pk": self.track.pk})
+        self.client.get(url)
+        self.client.get(url, HTTP_RANGE="bytes=100-")
+
+        track_counters.flush()
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.auditions, 1)
+
+    def test_play_session_of_other_track_counts(self):
+        other_track = self.user.tracks.create(title="other", license=self.license)
+        play_session = create_play_session(other_track.pk)
+        url = reverse("stream_track", kwargs={"pk": self.track.pk})
+        response = self.client.get(url, HTTP_X_PLAY_SESSION=play_session)
+
+        self.assertIn("X-Play-Session", response)
+        track_counters.flush()
+        self.track.refresh_from_db()
         self.assertEqual(self.track.auditions, 1)
 
     def test_get_invalid_track_audition(self):
@@ -69,97 +268,1774 @@ class StreamingTrackAPIViewTest(APITestCase):
         )
 
 
-class DownloadTrackAPIViewTest(APITestCase):
+class ParseRangeHeaderTest(APITestCase):
+    def test_whole_file(self):
+        for header in (None, "", "bytes=-", "bytes=0-1,5-6", "items=0-1", "bytes=5-1"):
+            self.assertIsNone(parse_range_header(header, 100))
+
+    def test_ranges(self):
+        self.assertEqual(parse_range_header("bytes=0-9", 100), (0, 9))
+        self.assertEqual(parse_range_header("bytes=10-", 100), (10, 99))
+        self.assertEqual(parse_range_header("bytes=90-200", 100), (90, 99))
+        self.assertEqual(parse_range_header("bytes=-10", 100), (90, 99))
+        self.assertEqual(parse_range_header("bytes=-200", 100), (0, 99))
+
+    def test_not_satisfiable(self):
+        for header in ("bytes=100-", "bytes=100-200", "bytes=-0"):
+            with self.assertRaises(RangeNotSatisfiable):
+                parse_range_header(header, 100)
+
+
+@override_settings(STREAMING_BACKEND="native")
+class NativeStreamingTest(APITestCase):
     def setUp(self) -> None:
+        pause_counters_flusher(self)
         self.user = User.objects.create_user(
             email="test@gmail.com", password="12345678test"
         )
         self.license = self.user.licenses.create(text="text")
         self.track = self.user.tracks.create(title="title", license=self.license)
         with open("audio_library/tests/test_track.mp3", "rb") as file_data:
+            self.content = file_data.read()
+            file_data.seek(0)
             self.track.file.save("test_track.mp3", File(file_data))
-        self.track.save()
+        self.url = reverse("stream_track", kwargs={"pk": self.track.pk})
 
     def tearDown(self) -> None:
         self.track.file.delete()
 
-    def test_get_valid_track_download(self):
+    def test_stream_whole_file(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("X-Accel-Redirect", response)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(int(response["Content-Length"]), len(self.content))
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+    def test_stream_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-199")
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(
+            response["Content-Range"], f"bytes 100-199/{len(self.content)}"
+        )
+        self.assertEqual(response["Content-Length"], "100")
+        self.assertEqual(b"".join(response.streaming_content), self.content[100:200])
+
+    def test_stream_suffix_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-10")
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(response.streaming_content), self.content[-10:])
+
+    def test_stream_range_not_satisfiable(self):
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.content)}-")
+
+        self.assertEqual(
+            response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.content)}")
+
+    def serve_through_gunicorn(self, **headers):
+        # Serve through gunicorn's file_wrapper, which sendfiles anything
+        # with a fileno, as the test client never does
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+        environ = RequestFactory().get(self.url, **headers).environ
+        environ["wsgi.file_wrapper"] = FileWrapper
+        server, client = socket.socketpair()
+        self.addCleanup(client.close)
+        response = GunicornResponse(
+            mock.Mock(version=(1, 1), should_close=lambda: True), server, Config()
+        )
+
+        result = WSGIHandler()(environ, response.start_response)
+        self.assertIsInstance(result, FileWrapper)
+        with mock.patch("os.sendfile", wraps=os.sendfile) as sendfile:
+            response.write_file(result)
+        result.close()
+        server.close()
+        data = b""
+        while chunk := client.recv(65536):
+            data += chunk
+        return data.split(b"\r\n\r\n", 1), sendfile.called
+
+    def test_stream_range_through_gunicorn(self):
+        (head, body), sendfile_called = self.serve_through_gunicorn(
+            HTTP_RANGE="bytes=100-199"
+        )
+        self.assertIn(b"206 Partial Content", head)
+        self.assertEqual(body, self.content[100:200])
+        self.assertFalse(sendfile_called)
+
+    def test_stream_whole_file_through_gunicorn(self):
+        (head, body), sendfile_called = self.serve_through_gunicorn()
+        self.assertIn(b"200 OK", head)
+        self.assertEqual(body, self.content)
+        self.assertTrue(sendfile_called)
+
+    @mock.patch("audio_library.views.schedule_track_processing")
+    def test_stream_after_file_replacement(self, mock_schedule):
+        Track.objects.filter(pk=self.track.pk).update(
+            file_size=len(self.content), duration=6.0, bitrate=128, sample_rate=44100
+        )
+        content = b"ID3" + b"\x00" * 2000
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(
+            reverse("track-detail", args=[self.track.pk]),
+            {"file": SimpleUploadedFile("new.mp3", content)},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["duration"])
+        self.assertIsNone(response.data["file_size"])
+        self.track.refresh_from_db()
+
+        response = self.client.get(self.url)
+        self.assertEqual(int(response["Content-Length"]), len(content))
+        self.assertEqual(b"".join(response.streaming_content), content)
+
+    def test_download_range(self):
+        Track.objects.filter(pk=self.track.pk).update(file_name="test_track.mp3")
         url = reverse("download_track", kwargs={"pk": self.track.pk})
+        response = self.client.get(url, HTTP_RANGE="bytes=0-9")
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="test_track.mp3"'
+        )
+        self.assertEqual(b"".join(response.streaming_content), self.content[:10])
+
+
+@override_settings(STREAM_URL_SECRET="secret", STREAM_URL_TTL=60)
+class StreamUrlTest(APITestCase):
+    def setUp(self) -> None:
+        pause_counters_flusher(self)
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.track = self.user.tracks.create(
+            title="title", license=self.license, file="media/tracks/1/my track.mp3"
+        )
+
+    def split_url(self, url):
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        return unquote(parts.path), query["md5"][0], query["expires"][0]
+
+    def test_signed_url_verifies(self):
+        url, expires = sign_stream_url("media/tracks/1/track.mp3", now=1000)
+        uri, md5, url_expires = self.split_url(url)
+
+        self.assertEqual(uri, "/secure/media/tracks/1/track.mp3")
+        self.assertEqual(expires, 1060)
+        self.assertEqual(url_expires, "1060")
+        self.assertTrue(verify_stream_url(uri, md5, url_expires, now=1059))
+
+    def test_signed_url_expires(self):
+        url, _ = sign_stream_url("media/tracks/1/track.mp3", now=1000)
+
+        self.assertFalse(verify_stream_url(*self.split_url(url), now=1061))
+
+    def test_tampered_signed_url(self):
+        url, _ = sign_stream_url("media/tracks/1/track.mp3", now=1000)
+        uri, md5, expires = self.split_url(url)
+
+        self.assertFalse(verify_stream_url(uri, md5, "2000", now=1000))
+        self.assertFalse(
+            verify_stream_url("/secure/media/tracks/1/other.mp3", md5, expires, 1000)
+        )
+        with override_settings(STREAM_URL_SECRET="other"):
+            self.assertFalse(verify_stream_url(uri, md5, expires, now=1000))
+
+    def test_get_stream_url(self):
+        url = reverse("stream_url", kwargs={"pk": self.track.pk})
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        uri, md5, expires = self.split_url(response.data["url"])
+        self.assertEqual(uri, "/secure/media/tracks/1/my track.mp3")
+        self.assertTrue(verify_stream_url(uri, md5, expires))
+        track_counters.flush()
         self.track.refresh_from_db()
-        self.assertEqual(self.track.downloads, 1)
+        self.assertEqual(self.track.auditions, 1)
 
-    def test_get_invalid_track_download(self):
-        url = reverse("download_track", kwargs={"pk": 9999})
+    def test_refetched_stream_url_counts_once(self):
+        url = reverse("stream_url", kwargs={"pk": self.track.pk})
+        play_session = self.client.get(url)["X-Play-Session"]
+        self.client.get(url)
+        self.client.get(url, HTTP_X_PLAY_SESSION=play_session)
+
+        track_counters.flush()
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.auditions, 1)
+
+    def test_get_stream_url_private_track(self):
+        self.track.private = True
+        self.track.save()
+        url = reverse("stream_url", kwargs={"pk": self.track.pk})
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
-        self.assertEqual(response.data, {"track": "Such track doesn't exist"})
 
-    def test_get_track_download_without_file(self):
-        self.track.file.delete()
-        url = reverse("download_track", kwargs={"pk": self.track.pk})
+
+class HLSTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.track = self.user.tracks.create(
+            title="title", license=self.license, file="media/tracks/1/track.mp3"
+        )
+        self.addCleanup(
+            shutil.rmtree,
+            default_storage.path(get_path_track_hls(self.track)),
+            ignore_errors=True,
+        )
+
+    @mock.patch("audio_library.services.hls.subprocess.run")
+    def test_segment_track(self, mock_run):
+        def run_ffmpeg(command, **kwargs):
+            with open(command[-1], "w") as manifest:
+                manifest.write("#EXTM3U")
+
+        mock_run.side_effect = run_ffmpeg
+        segment_track(self.track)
+
+        command = mock_run.call_args.args[0]
+        self.assertEqual(command[command.index("-hls_time") + 1], "10")
+        self.assertNotIn("-hls_base_url", command)
+        self.assertEqual(
+            get_path_track_hls(self.track), f"media/tracks/1/track/{self.track.pk}/hls"
+        )
+        with default_storage.open(get_hls_manifest_name(self.track)) as manifest:
+            self.assertEqual(manifest.read(), b"#EXTM3U")
+
+    @override_settings(STREAM_URL_SECRET="secret", STREAM_URL_TTL=60)
+    def test_get_manifest(self):
+        default_storage.save(
+            get_hls_manifest_name(self.track),
+            ContentFile(b"#EXTM3U\n#EXTINF:10.0,\nsegment_00000.ts\n#EXT-X-ENDLIST"),
+        )
+        url = reverse("hls_track", kwargs={"pk": self.track.pk})
+        with mock.patch("time.time", return_value=1000):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/vnd.apple.mpegurl")
+        segment_url, _ = sign_stream_url(
+            f"{get_path_track_hls(self.track)}/segment_00000.ts", now=1000
+        )
+        self.assertEqual(
+            response.content.decode().splitlines(),
+            ["#EXTM3U", "#EXTINF:10.0,", segment_url, "#EXT-X-ENDLIST"],
+        )
+        self.assertTrue(segment_url.startswith("/secure/media/tracks/1/track/"))
+
+    def test_get_manifest_not_ready(self):
+        url = reverse("hls_track", kwargs={"pk": self.track.pk})
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TranscodingTest(APITestCase):
+    def setUp(self) -> None:
+        pause_counters_flusher(self)
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.track = self.user.tracks.create(
+            title="title", license=self.license, file="media/tracks/1/track.wav"
+        )
+        self.renditions = {
+            "low": "media/tracks/1/track/1/renditions/low.mp3",
+            "medium": "media/tracks/1/track/1/renditions/medium.mp3",
+            "high": "media/tracks/1/track/1/renditions/high.mp3",
+        }
+        self.factory = RequestFactory()
+
+    @mock.patch("audio_library.services.transcoding.get_pool")
+    def test_transcode_track(self, mock_get_pool):
+        def submit(func, ffmpeg, source, destination, bitrate):
+            future = Future()
+            if bitrate == 192:
+                future.set_exception(RuntimeError)
+            else:
+                future.set_result(None)
+            return future
+
+        mock_get_pool.return_value.submit.side_effect = submit
+        with mock.patch("audio_library.services.transcoding.logger"):
+            transcode_track(self.track)
+
+        self.track.refresh_from_db()
         self.assertEqual(
-            response.data, {"track": "File with this track doesn't exist or removed"}
+            self.track.renditions,
+            {
+                "low": f"media/tracks/1/track/{self.track.pk}/renditions/low.mp3",
+                "medium": f"media/tracks/1/track/{self.track.pk}/renditions/medium.mp3",
+            },
         )
 
+    def test_choose_rendition_by_quality(self):
+        self.track.renditions = self.renditions
+        request = self.factory.get("/", {"quality": "medium"})
+        self.assertEqual(
+            choose_rendition(request, self.track), self.renditions["medium"]
+        )
 
-class PublicAlbumAPIViewTest(APITestCase):
+        request = self.factory.get("/", {"quality": "original"})
+        self.assertEqual(choose_rendition(request, self.track), self.track.file.name)
+
+    def test_choose_rendition_by_client_hints(self):
+        self.track.renditions = self.renditions
+        cases = (
+            ({}, self.track.file.name),
+            ({"HTTP_SAVE_DATA": "on"}, self.renditions["low"]),
+            ({"HTTP_ECT": "3g"}, self.renditions["medium"]),
+            ({"HTTP_DOWNLINK": "0.3"}, self.renditions["medium"]),
+            ({"HTTP_ECT": "4g", "HTTP_DOWNLINK": "10"}, self.renditions["high"]),
+        )
+        for headers, expected in cases:
+            request = self.factory.get("/", **headers)
+            self.assertEqual(choose_rendition(request, self.track), expected)
+
+    def test_choose_rendition_without_renditions(self):
+        request = self.factory.get("/", {"quality": "low"}, HTTP_SAVE_DATA="on")
+        self.assertEqual(choose_rendition(request, self.track), self.track.file.name)
+
+    @mock.patch("audio_library.views.os.path.exists", return_value=True)
+    def test_stream_rendition(self, mock_exists):
+        self.track.renditions = self.renditions
+        self.track.save()
+        url = reverse("stream_track", kwargs={"pk": self.track.pk})
+        response = self.client.get(url, {"quality": "low"})
+
+        self.assertEqual(response["X-Accel-Redirect"], f"/mp3/{self.renditions['low']}")
+        self.assertIn("ECT", response["Vary"])
+
+
+class WaveformTest(APITestCase):
     def setUp(self) -> None:
         self.user = User.objects.create_user(
             email="test@gmail.com", password="12345678test"
         )
-        self.first_album = self.user.albums.create(
-            name="First Album", description="Description", private=False
+        self.license = self.user.licenses.create(text="text")
+        self.track = self.user.tracks.create(
+            title="title", license=self.license, file="media/tracks/1/track.mp3"
         )
-        self.second_album = self.user.albums.create(
-            name="Second Album", description="Description", private=True
+        self.addCleanup(default_storage.delete, get_path_track_waveform(self.track))
+
+    def test_compute_peaks(self):
+        samples = np.zeros(64 * 8, dtype=np.int16)
+        samples[0] = -32768
+        samples[64 * 4 + 1] = 16384
+        chunks = [samples[:100], samples[100:300], samples[300:]]
+
+        peaks = compute_peaks(chunks, 4)
+
+        self.assertEqual(peaks.dtype, np.int8)
+        self.assertEqual(peaks.tolist(), [127, 0, 63, 0])
+
+    def test_compute_peaks_of_short_track(self):
+        peaks = compute_peaks([np.full(10, 32767, dtype=np.int16)], 4)
+        self.assertEqual(peaks.tolist(), [127, 127, 127, 127])
+
+        peaks = compute_peaks([], 4)
+        self.assertEqual(peaks.tolist(), [0, 0, 0, 0])
+
+    @mock.patch("audio_library.services.waveform.decode_samples")
+    def test_extract_and_load_waveform(self, mock_decode_samples):
+        samples = (np.arange(64 * 4096) // 8).astype(np.int16)
+        mock_decode_samples.return_value = [samples]
+
+        extract_waveform(self.track)
+
+        self.assertEqual(
+            os.path.getsize(default_storage.path(get_path_track_waveform(self.track))),
+            4096,
         )
+        peaks = load_waveform(self.track, 256)
+        self.assertEqual(len(peaks), 256)
+        self.assertEqual(peaks[-1], 127)
+        self.assertTrue(np.all(np.diff(peaks) >= 0))
 
-    def test_get_user_albums(self):
-        url = reverse("author_albums", kwargs={"pk": self.user.pk})
-        response = self.client.get(url)
+    def test_get_waveform(self):
+        default_storage.save(
+            get_path_track_waveform(self.track),
+            ContentFile(np.arange(4096, dtype=np.int16).astype(np.int8).tobytes()),
+        )
+        url = reverse("track_waveform", kwargs={"pk": self.track.pk})
+        response = self.client.get(url, {"resolution": 256})
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["name"], "First Album")
+        self.assertEqual(response.data["resolution"], 256)
+        self.assertEqual(len(response.data["peaks"]), 256)
+        self.assertEqual(response.data["peaks"][0], 15)
 
+    def test_get_waveform_failure(self):
+        url = reverse("track_waveform", kwargs={"pk": self.track.pk})
 
-class TrackListAPIViewTest(APITestCase):
+        response = self.client.get(url, {"resolution": 100})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AudioMetadataTest(APITestCase):
+    def write_temp_file(self, content: bytes) -> str:
+        temp_file = tempfile.NamedTemporaryFile(delete=False)
+        temp_file.write(content)
+        temp_file.close()
+        self.addCleanup(os.remove, temp_file.name)
+        return temp_file.name
+
+    def test_read_mp3_info(self):
+        id3 = b"ID3\x03\x00\x00\x00\x00\x00\x0a" + b"\x00" * 10
+        # MPEG1 Layer III, 128 kbps, 44.1 kHz: 417 bytes and 1152 samples
+        frame = b"\xff\xfb\x90\xc4" + b"\x00" * 413
+        path = self.write_temp_file(id3 + b"junk" + frame * 100 + b"TAG" * 10)
+
+        info = read_audio_info(path)
+
+        self.assertAlmostEqual(info.duration, 100 * 1152 / 44100)
+        self.assertEqual(info.bitrate, 128)
+        self.assertEqual(info.sample_rate, 44100)
+
+    def test_read_wav_info(self):
+        content = io.BytesIO()
+        with wave.open(content, "wb") as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(22050)
+            wav.writeframes(b"\x00" * 4 * 22050 * 3)
+        path = self.write_temp_file(content.getvalue())
+
+        info = read_audio_info(path)
+
+        self.assertAlmostEqual(info.duration, 3)
+        self.assertEqual(info.bitrate, 706)
+        self.assertEqual(info.sample_rate, 22050)
+
+    def test_read_unsupported_file(self):
+        with self.assertRaises(ValueError):
+            read_audio_info(self.write_temp_file(b"not an audio file"))
+
+    def test_extract_metadata(self):
+        user = User.objects.create_user(email="test@gmail.com", password="12345678")
+        license = user.licenses.create(text="text")
+        track = user.tracks.create(title="title", license=license)
+        with open("audio_library/tests/test_track.mp3", "rb") as file_data:
+            track.file.save("test_track.mp3", File(file_data))
+        self.addCleanup(track.file.delete)
+
+        extract_metadata(track)
+
+        track.refresh_from_db()
+        self.assertEqual(track.file_size, track.file.size)
+        self.assertGreater(track.duration, 0)
+        self.assertTrue(track.bitrate)
+        self.assertTrue(track.sample_rate)
+        url = reverse("track_list")
+        result = self.client.get(url).data["results"][0]
+        self.assertEqual(result["duration"], track.duration)
+        self.assertEqual(result["file_size"], track.file_size)
+
+    @override_settings(STREAMING_BACKEND="native")
+    def test_stream_with_stored_size(self):
+        pause_counters_flusher(self)
+        user = User.objects.create_user(email="test@gmail.com", password="12345678")
+        license = user.licenses.create(text="text")
+        track = user.tracks.create(title="title", license=license)
+        with open("audio_library/tests/test_track.mp3", "rb") as file_data:
+            track.file.save("test_track.mp3", File(file_data))
+        self.addCleanup(track.file.delete)
+        Track.objects.filter(pk=track.pk).update(file_size=track.file.size)
+
+        url = reverse("stream_track", kwargs={"pk": track.pk})
+        with mock.patch("os.path.exists") as mock_exists, mock.patch(
+            "os.path.getsize"
+        ) as mock_getsize:
+            response = self.client.get(url, HTTP_RANGE="bytes=0-9")
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response["Content-Range"], f"bytes 0-9/{track.file.size}")
+        mock_exists.assert_not_called()
+        mock_getsize.assert_not_called()
+
+    @override_settings(STREAMING_BACKEND="native")
+    def test_stream_removed_file_with_stored_size(self):
+        user = User.objects.create_user(email="test@gmail.com", password="12345678")
+        license = user.licenses.create(text="text")
+        track = user.tracks.create(
+            title="title",
+            license=license,
+            file="media/tracks/1/removed.mp3",
+            file_size=100,
+        )
+
+        url = reverse("stream_track", kwargs={"pk": track.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TrackAPIViewTest(APITestCase):
     def setUp(self) -> None:
         self.user = User.objects.create_user(
             email="test@gmail.com", password="12345678test"
         )
         self.license = self.user.licenses.create(text="text")
+        self.genre = Genre.objects.create(name="Rock")
+        self.client.force_authenticate(user=self.user)
 
-        self.track = self.user.tracks.create(title="title", license=self.license)
+    def tearDown(self) -> None:
+        for track in Track.objects.all():
+            track.file.delete()
+
+    @mock.patch("audio_library.services.processing.get_executor")
+    def test_upload_schedules_processing(self, mock_get_executor):
+        url = reverse("track-list")
         with open("audio_library/tests/test_track.mp3", "rb") as file_data:
-            self.track.file.save("test_track.mp3", File(file_data))
-        self.track.save()
+            data = {
+                "title": "title",
+                "license": self.license.pk,
+                "genre": [self.genre.pk],
+                "file": file_data,
+            }
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, data, format="multipart")
 
-        self.track_1 = self.user.tracks.create(
-            title="title_1", license=self.license, private=True
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_get_executor.return_value.submit.assert_called_once_with(
+            process_track, response.data["id"]
         )
+
+    @mock.patch("audio_library.views.schedule_track_processing")
+    def test_upload_is_hashed_in_flight(self, mock_schedule):
         with open("audio_library/tests/test_track.mp3", "rb") as file_data:
-            self.track_1.file.save("test_track_1.mp3", File(file_data))
-        self.track_1.save()
+            content_hash = hashlib.sha256(file_data.read()).hexdigest()
+            file_data.seek(0)
+            data = {
+                "title": "title",
+                "license": self.license.pk,
+                "genre": [self.genre.pk],
+                "file": file_data,
+            }
+            with mock.patch("core.storage.hash_file") as mock_hash_file:
+                response = self.client.post(reverse("track-list"), data)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_hash_file.assert_not_called()
+        track = Track.objects.get(pk=response.data["id"])
+        self.assertTrue(track.file.name.endswith(f"/{content_hash}.mp3"))
+        self.assertEqual(track.file_name, "test_track.mp3")
+
+    def test_upload_rejects_content_not_matching_extension(self):
+        data = {
+            "title": "title",
+            "license": self.license.pk,
+            "genre": [self.genre.pk],
+            "file": SimpleUploadedFile("track.mp3", b"<html>not audio</html>"),
+        }
+        response = self.client.post(reverse("track-list"), data)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data, {"file": ["File content doesn't match its extension"]}
+        )
+        self.assertFalse(Track.objects.exists())
+
+    @override_settings(TRACK_SIZE_MB_LIMIT=0.0001)
+    def test_upload_rejects_oversized_file(self):
+        with open("audio_library/tests/test_track.mp3", "rb") as file_data:
+            data = {
+                "title": "title",
+                "license": self.license.pk,
+                "genre": [self.genre.pk],
+                "file": file_data,
+            }
+            response = self.client.post(reverse("track-list"), data)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("file", response.data)
+
+
+@override_settings(TRACK_UPLOAD_CHUNK_SIZE=4)
+class UploadSessionAPIViewTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.genre = Genre.objects.create(name="Rock")
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            reverse("upload-list"), {"file_name": "track.mp3", "size": 10}
+        )
+        self.session_id = response.data["id"]
 
     def tearDown(self) -> None:
-        self.track.file.delete()
-        self.track_1.file.delete()
+        for session in UploadSession.objects.all():
+            discard_upload(session)
+        for track in Track.objects.all():
+            os.remove(track.file.path)
 
-    def test_get_track_list(self):
-        url = reverse("track_list")
-        response = self.client.get(url)
+    def put_chunk(self, index, data):
+        return self.client.generic(
+            "PUT",
+            reverse("upload-chunk", args=[self.session_id, index]),
+            data,
+            content_type="application/octet-stream",
+        )
 
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data["count"], 1)
-        self.assertEqual(response.data["results"][0]["title"], "title")
+    def test_upload_chunks_in_any_order(self):
+        self.assertEqual(self.put_chunk(2, b"90").status_code, 204)
+        self.assertEqual(self.put_chunk(0, b"ID34").status_code, 204)
+        response = self.client.get(reverse("upload-detail", args=[self.session_id]))
+        self.assertEqual(response.data["missing"], [1])
+
+        url = reverse("upload-finalize", args=[self.session_id])
+        response = self.client.post(url, {"title": "title"})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data, {"missing": [1]})
+
+        self.assertEqual(self.put_chunk(1, b"5678").status_code, 204)
+        data = {"title": "title", "license": self.license.pk, "genre": [self.genre.pk]}
+        with mock.patch("audio_library.views.schedule_track_processing"):
+            response = self.client.post(url, data)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        track = Track.objects.get(pk=response.data["id"])
+        with track.file.open("rb") as file:
+            self.assertEqual(file.read(), b"ID34567890")
+        self.assertFalse(UploadSession.objects.exists())
+
+    def put_all_chunks(self, data):
+        for index in range(3):
+            self.put_chunk(index, data[index * 4 : index * 4 + 4])
+
+    def test_finalize_checks_content(self):
+        self.put_all_chunks(b"<html></ht")
+        url = reverse("upload-finalize", args=[self.session_id])
+        response = self.client.post(url, {"title": "title", "license": self.license.pk})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data, {"file": ["File content doesn't match its extension"]}
+        )
+        self.assertFalse(Track.objects.exists())
+
+    def test_finalize_of_vanished_upload(self):
+        self.put_all_chunks(b"ID34567890")
+        discard_upload(UploadSession.objects.get())
+        url = reverse("upload-finalize", args=[self.session_id])
+        response = self.client.post(url, {"title": "title", "license": self.license.pk})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stale_sessions_expire(self):
+        session = UploadSession.objects.get()
+        orphan = os.path.join(os.path.dirname(get_upload_path(session)), "x.part")
+        open(orphan, "wb").close()
+        os.utime(orphan, (0, 0))
+
+        self.assertEqual(expire_upload_sessions(), 0)
+        later = timezone.now() + timedelta(hours=25)
+        self.assertEqual(expire_upload_sessions(later), 1)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(get_upload_path(session)))
+        self.assertFalse(os.path.exists(orphan))
+
+    def test_chunk_size_must_match(self):
+        response = self.put_chunk(0, b"12345")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.put_chunk(3, b"1234")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_session_rejects_other_formats(self):
+        response = self.client.post(
+            reverse("upload-list"), {"file_name": "track.ogg", "size": 10}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SoftDeleteTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.album = self.user.albums.create(name="album", description="text")
+        self.track = self.user.tracks.create(
+            title="title", license=self.license, album=self.album
+        )
+        self.track.file.save("track.mp3", ContentFile(b"soft deleted audio"))
+        self.client.force_authenticate(user=self.user)
+
+    def test_destroy_track_queues_files(self):
+        path = self.track.file.path
+        with mock.patch.object(flusher, "interval", 0):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(
+                    reverse("track-detail", args=[self.track.pk])
+                )
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Track.objects.filter(pk=self.track.pk).exists())
+        self.assertTrue(Track.all_objects.get(pk=self.track.pk).is_deleted)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(FileDeletion.objects.exists())
+
+    def test_deletion_queue_is_durable(self):
+        path = self.track.file.path
+        with mock.patch("audio_library.services.deletion.flusher.notify"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(reverse("album-detail", args=[self.album.pk]))
+                self.client.delete(reverse("track-detail", args=[self.track.pk]))
+
+        self.assertIsNone(Track.all_objects.get(pk=self.track.pk).album)
+        self.assertFalse(Album.objects.exists())
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(FileDeletion.objects.filter(name=self.track.file.name).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("purge_deleted_files", stdout=io.StringIO())
+        self.assertFalse(FileDeletion.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    @mock.patch("audio_library.views.schedule_track_processing")
+    def test_file_replacement_queues_derived_media(self, mock_schedule):
+        old_media = get_path_track_media(self.track)
+        url = reverse("track-detail", args=[self.track.pk])
+        with mock.patch("audio_library.services.deletion.flusher.notify"):
+            for _ in range(2):
+                file = SimpleUploadedFile("new.mp3", b"ID3 replaced audio")
+                self.client.patch(url, {"file": file}, format="multipart")
+
+        self.track.refresh_from_db()
+        queued = set(FileDeletion.objects.values_list("name", flat=True))
+        self.assertIn(old_media, queued)
+        self.assertNotIn(get_path_track_media(self.track), queued)
+
+    def test_deleted_album_name_can_be_reused(self):
+        data = {"name": "album", "description": "text"}
+        response = self.client.post(reverse("album-list"), data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        soft_delete(self.album)
+        response = self.client.post(reverse("album-list"), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Album.all_objects.filter(name="album").count(), 2)
+
+
+class ContentAddressedStorageTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+
+    def create_track(self, content: bytes) -> Track:
+        track = self.user.tracks.create(title="title", license=self.license)
+        track.file.save("Track.MP3", ContentFile(content))
+        return track
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.create_track(b"same audio")
+        second = self.create_track(b"same audio")
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertRegex(
+            first.file.name, r"^media/tracks/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.mp3$"
+        )
+        self.assertEqual(MediaBlob.objects.get(name=first.file.name).ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.file.delete()
+        self.assertTrue(media_storage.exists(second.file.name))
+
+        name = second.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            second.file.delete()
+        self.assertFalse(media_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_migrate_media_storage(self):
+        track = self.user.tracks.create(title="title", license=self.license)
+        legacy_name = f"media/tracks/{self.user.pk}/track.mp3"
+        os.makedirs(os.path.dirname(media_storage.path(legacy_name)), exist_ok=True)
+        with open(media_storage.path(legacy_name), "wb") as file:
+            file.write(b"legacy audio")
+        Track.objects.filter(pk=track.pk).update(file=legacy_name)
+
+        call_command("migrate_media_storage", stdout=io.StringIO())
+
+        track.refresh_from_db()
+        self.addCleanup(os.remove, track.file.path)
+        self.assertTrue(media_storage.is_blob_name(track.file.name))
+        self.assertFalse(os.path.exists(media_storage.path(legacy_name)))
+        with track.file.open("rb") as file:
+            self.assertEqual(file.read(), b"legacy audio")
+        self.assertEqual(MediaBlob.objects.get(name=track.file.name).ref_count, 1)
+
+
+@override_settings(STREAMING_BACKEND="native")
+class ThumbnailTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        cover = io.BytesIO()
+        Image.new("RGB", (600, 300), "red").save(cover, "JPEG")
+        self.album = self.user.albums.create(name="album", description="text")
+        self.album.cover.save("cover.jpg", ContentFile(cover.getvalue()))
+        self.addCleanup(os.remove, self.album.cover.path)
+        self.addCleanup(
+            shutil.rmtree, media_storage.path(THUMBNAIL_DIR), ignore_errors=True
+        )
+
+    def test_serializer_exposes_thumbnail_urls(self):
+        response = self.client.get(reverse("author_albums", args=[self.user.pk]))
+        urls = response.data[0]["cover_thumbnails"]
+        self.assertEqual(list(urls), ["64", "256", "512"])
+        self.assertTrue(urls["64"].endswith(f"/thumbnail/64/{self.album.cover.name}"))
+
+    def test_thumbnail_is_rendered_once(self):
+        url = reverse("thumbnail", args=[64, self.album.cover.name])
+        response = self.client.get(url, HTTP_ACCEPT="image/webp,*/*")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("Accept", response["Vary"])
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (64, 32))
+
+        with mock.patch("core.thumbnails.render_thumbnail") as mock_render:
+            response = self.client.get(url, HTTP_ACCEPT="image/webp,*/*")
+            response.close()
+        mock_render.assert_not_called()
+
+        response = self.client.get(url)
+        response.close()
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+
+    def test_unknown_size_and_image(self):
+        url = reverse("thumbnail", args=[100, self.album.cover.name])
+        self.assertEqual(self.client.get(url).status_code, 400)
+        url = reverse("thumbnail", args=[64, "media/albums/cover.jpg"])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_least_recently_used_thumbnails_are_evicted(self):
+        cache = ThumbnailCache(max_size=10**9)
+        large = cache.get(self.album.cover.name, 512, "jpeg")
+        os.utime(media_storage.path(large), (0, 0))
+        cache.max_size = media_storage.size(large)
+        small = cache.get(self.album.cover.name, 64, "jpeg")
+
+        self.assertFalse(media_storage.exists(large))
+        self.assertTrue(media_storage.exists(small))
+
+
+class DownloadTrackAPIViewTest(APITestCase):
+    def setUp(self) -> None:
+        pause_counters_flusher(self)
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.track = self.user.tracks.create(title="title", license=self.license)
+        with open("audio_library/tests/test_track.mp3", "rb") as file_data:
+            self.track.file.save("test_track.mp3", File(file_data))
+        self.track.save()
+
+    def tearDown(self) -> None:
+        self.track.file.delete()
+
+    def test_get_valid_track_download(self):
+        url = reverse("download_track", kwargs={"pk": self.track.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        track_counters.flush()
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.downloads, 1)
+
+    def test_get_invalid_track_download(self):
+        url = reverse("download_track", kwargs={"pk": 9999})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data, {"track": "Such track doesn't exist"})
+
+    def test_get_track_download_without_file(self):
+        self.track.file.delete()
+        url = reverse("download_track", kwargs={"pk": self.track.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            response.data, {"track": "File with this track doesn't exist or removed"}
+        )
+
+
+@mock.patch("audio_library.services.counters.flusher.ensure_started")
+class TrackCounterBufferTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.track = self.user.tracks.create(title="title", license=self.license)
+        self.buffer = TrackCounterBuffer()
+
+    def test_flush_writes_buffered_increments(self, mock_ensure_started):
+        for _ in range(3):
+            self.buffer.increment(self.track.pk, "auditions")
+        self.buffer.increment(self.track.pk, "downloads")
+
+        self.buffer.flush()
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.auditions, 3)
+        self.assertEqual(self.track.downloads, 1)
+
+        with self.assertNumQueries(0):
+            self.buffer.flush()
+
+    def test_flush_keeps_concurrent_increments(self, mock_ensure_started):
+        self.buffer.increment(self.track.pk, "auditions")
+        Track.objects.filter(pk=self.track.pk).update(auditions=10)
+        self.buffer.flush()
+
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.auditions, 11)
+
+    @mock.patch("audio_library.services.counters.logger")
+    @mock.patch("audio_library.services.counters.Track.objects.filter")
+    def test_failed_flush_keeps_batch(
+        self, mock_filter, mock_logger, mock_ensure_started
+    ):
+        mock_filter.side_effect = RuntimeError
+        self.buffer.increment(self.track.pk, "auditions")
+        self.buffer.flush()
+        mock_filter.side_effect = None
+        mock_filter.reset_mock()
+
+        self.buffer.flush()
+        mock_filter.assert_called_once_with(pk=self.track.pk)
+
+    @mock.patch("audio_library.services.counters.close_old_connections")
+    def test_flusher_thread_renews_connections(
+        self, mock_close_old_connections, mock_ensure_started
+    ):
+        background_flusher = BackgroundFlusher(5)
+        buffer = background_flusher.register(mock.Mock())
+        buffer.flush.side_effect = InterfaceError
+        with mock.patch.object(
+            background_flusher._stopped, "wait", side_effect=[False, False, True]
+        ), mock.patch("audio_library.services.counters.logger"):
+            background_flusher._run()
+
+        self.assertEqual(buffer.flush.call_count, 2)
+        self.assertEqual(mock_close_old_connections.call_count, 4)
+
+    def test_unknown_counter(self, mock_ensure_started):
+        with self.assertRaises(ValueError):
+            self.buffer.increment(self.track.pk, "likes")
+
+
+class PublicAlbumAPIViewTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.first_album = self.user.albums.create(
+            name="First Album", description="Description", private=False
+        )
+        self.second_album = self.user.albums.create(
+            name="Second Album", description="Description", private=True
+        )
+
+    def test_get_user_albums(self):
+        url = reverse("author_albums", kwargs={"pk": self.user.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["name"], "First Album")
+
+
+class TrackListAPIViewTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+
+        self.track = self.user.tracks.create(title="title", license=self.license)
+        with open("audio_library/tests/test_track.mp3", "rb") as file_data:
+            self.track.file.save("test_track.mp3", File(file_data))
+        self.track.save()
+
+        self.track_1 = self.user.tracks.create(
+            title="title_1", license=self.license, private=True
+        )
+        with open("audio_library/tests/test_track.mp3", "rb") as file_data:
+            self.track_1.file.save("test_track_1.mp3", File(file_data))
+        self.track_1.save()
+
+    def tearDown(self) -> None:
+        self.track.file.delete()
+        self.track_1.file.delete()
+
+    def test_get_track_list(self):
+        url = reverse("track_list")
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(response.data["results"][0]["title"], "title")
+
+    def test_conditional_get(self):
+        url = reverse("track_list")
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(f"{url}?title=title", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.track.title = "new title"
+        self.track.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_nested_changes_invalidate_etag(self):
+        url = reverse("track_list")
+        etag = self.client.get(url)["ETag"]
+        self.user.username = "renamed"
+        self.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        genre = Genre.objects.create(name="Rock")
+        etag = self.client.get(reverse("genre"))["ETag"]
+        genre.name = "Jazz"
+        genre.save()
+        response = self.client.get(reverse("genre"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_comment_author_change_invalidates_etag(self):
+        self.track.track_comments.create(user=self.user, text="text")
+        url = reverse("track_comments", args=[self.track.pk])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.user.username = "renamed"
+        self.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@mock.patch.object(KeysetPagination, "page_size", 2)
+class KeysetPaginationTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.tracks = [
+            self.user.tracks.create(title=f"title{number}", license=self.license)
+            for number in range(5)
+        ]
+
+    def get_titles(self, response):
+        return [track["title"] for track in response.data["results"]]
+
+    def test_scrolling_with_inserts(self):
+        response = self.client.get(reverse("track_list"), {"cursor": ""})
+        self.assertEqual(self.get_titles(response), ["title4", "title3"])
+        self.assertNotIn("count", response.data)
+
+        self.user.tracks.create(title="new", license=self.license)
+        response = self.client.get(response.data["next"])
+        self.assertEqual(self.get_titles(response), ["title2", "title1"])
+        response = self.client.get(response.data["next"])
+        self.assertEqual(self.get_titles(response), ["title0"])
+        self.assertIsNone(response.data["next"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("track_list"), {"cursor": "broken"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_legacy_page_parameter(self):
+        with mock.patch.object(Pagination, "page_size", 2):
+            response = self.client.get(reverse("track_list"), {"page_size": 2})
+            self.assertEqual(response.data["count"], 5)
+            self.assertIn("page=3", response.data["next"])
+
+    def test_comments(self):
+        url = reverse("track_comments", args=[self.tracks[0].pk])
+        for number in range(3):
+            self.tracks[0].track_comments.create(user=self.user, text=f"{number}")
+        self.assertEqual(len(self.client.get(url).data), 3)
+
+        response = self.client.get(url, {"cursor": ""})
+        self.assertEqual([c["text"] for c in response.data["results"]], ["2", "1"])
+        response = self.client.get(response.data["next"])
+        self.assertEqual([c["text"] for c in response.data["results"]], ["0"])
+
+
+class TrackSearchTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test", username="Nirvana"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.genre = Genre.objects.create(name="Grunge")
+        self.album = self.user.albums.create(name="Nevermind", description="text")
+        self.track = self.user.tracks.create(
+            title="Smells Like Teen Spirit", license=self.license, album=self.album
+        )
+        self.other_track = self.user.tracks.create(
+            title="Teen Idle", license=self.license
+        )
+        self.url = reverse("track_search")
+
+    def search(self, query):
+        response = self.client.get(self.url, {"q": query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [track["id"] for track in response.data["results"]]
+
+    def test_ranked_search(self):
+        self.assertEqual(self.search("smell"), [self.track.pk])
+        self.assertEqual(self.search("nevermind teen"), [self.track.pk])
+        self.assertEqual(
+            set(self.search("nirvana")), {self.track.pk, self.other_track.pk}
+        )
+        self.assertEqual(self.search("teen")[0], self.other_track.pk)
+
+    def test_index_follows_changes(self):
+        self.track.genre.add(self.genre)
+        self.assertEqual(self.search("grunge"), [self.track.pk])
+        self.genre.name = "Rock"
+        self.genre.save()
+        self.assertEqual(self.search("rock"), [self.track.pk])
+
+        self.album.private = True
+        self.album.save()
+        self.assertEqual(self.search("smells"), [])
+        self.album.private = False
+        self.album.save()
+
+        self.user.username = "Foo"
+        self.user.save()
+        self.assertEqual(self.search("foo smells"), [self.track.pk])
+
+        soft_delete(self.track)
+        self.assertEqual(self.search("smells"), [])
+
+    @mock.patch("audio_library.signals.index_tracks")
+    def test_only_username_reindexes_author_tracks(self, mock_index_tracks):
+        self.user.set_password("new password")
+        self.user.about = "about"
+        self.user.save()
+        mock_index_tracks.assert_not_called()
+
+        self.user.username = "Foo"
+        self.user.save()
+        mock_index_tracks.assert_called_once()
+
+    def test_rebuild_search_index(self):
+        Track.objects.filter(pk=self.track.pk).update(title="Lithium")
+        call_command("rebuild_search_index", stdout=io.StringIO())
+        self.assertEqual(self.search("lithium"), [self.track.pk])
+        self.assertEqual(self.search("smells"), [])
+
+    def test_query_is_required(self):
+        response = self.client.get(self.url, {"q": " ?! "})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AutocompleteTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test", username="Beyoncé"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.private_album = self.user.albums.create(
+            name="album", description="text", private=True
+        )
+        self.track = self.user.tracks.create(
+            title="Halo", license=self.license, auditions=5
+        )
+        self.popular_track = self.user.tracks.create(
+            title="Crazy in Love", license=self.license, auditions=50
+        )
+        self.user.tracks.create(title="Hidden", license=self.license, private=True)
+        self.user.tracks.create(
+            title="Hold Up", license=self.license, album=self.private_album
+        )
+        self.index = AutocompleteIndex(0, 60 * 60)
+        index_patcher = mock.patch("audio_library.views.autocomplete_index", self.index)
+        index_patcher.start()
+        self.addCleanup(index_patcher.stop)
+        interval_patcher = mock.patch.object(flusher, "interval", 0)
+        interval_patcher.start()
+        self.addCleanup(interval_patcher.stop)
+
+    def suggest(self, query):
+        response = self.client.get(reverse("autocomplete"), {"q": query})
+        return [(item["type"], item["id"]) for item in response.data["results"]]
+
+    def test_prefix_suggestions(self):
+        self.assertEqual(self.suggest("ha"), [("track", self.track.pk)])
+        self.assertEqual(self.suggest("LOVE"), [("track", self.popular_track.pk)])
+        self.assertEqual(self.suggest("beyonce"), [("artist", self.user.pk)])
+        self.assertEqual(self.suggest("h"), [("track", self.track.pk)])
+        self.assertEqual(self.suggest(""), [])
+
+    def test_ranked_by_auditions(self):
+        self.user.tracks.create(title="Crazy Right Now", license=self.license)
+        self.assertEqual(self.suggest("crazy")[0], ("track", self.popular_track.pk))
+
+    def test_incremental_refresh(self):
+        self.suggest("halo")
+        self.track.title = "Single Ladies"
+        self.track.save()
+        self.private_album.private = False
+        self.private_album.save()
+
+        self.assertEqual(self.suggest("halo"), [])
+        self.assertEqual(self.suggest("single"), [("track", self.track.pk)])
+        self.assertEqual(len(self.suggest("hold")), 1)
+
+    def test_refresh_after_empty_build(self):
+        Track.all_objects.all().delete()
+        User.objects.all().delete()
+        self.assertEqual(self.suggest("halo"), [])
+
+        user = User.objects.create_user(
+            email="new@gmail.com", password="12345678test", username="new"
+        )
+        track = user.tracks.create(title="Halo", license=user.licenses.create(text="t"))
+        self.assertEqual(self.suggest("halo"), [("track", track.pk)])
+
+    def test_sync_off_the_request_path(self):
+        self.suggest("halo")
+        with mock.patch.object(flusher, "interval", 5), mock.patch.object(
+            flusher, "ensure_started"
+        ) as ensure_started, self.assertNumQueries(0):
+            self.assertEqual(self.suggest("halo"), [("track", self.track.pk)])
+        ensure_started.assert_called_once()
+
+    def test_rebuild_swaps_snapshot(self):
+        self.suggest("halo")
+        snapshot = self.index.snapshot
+        self.index.rebuilt_at = 0.0
+        self.index.pending.set()
+        self.index.flush()
+
+        self.assertIsNot(self.index.snapshot, snapshot)
+        self.assertEqual(self.index.snapshot.entries, snapshot.entries)
+        self.assertEqual(snapshot.entries, sorted(snapshot.entries))
+
+
+class LikeTrackAPIViewTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.track = self.user.tracks.create(title="title", license=self.license)
+        self.url = reverse("like_track", args=[self.track.pk])
+        self.client.force_authenticate(user=self.user)
+
+    def test_like_and_unlike_are_idempotent(self):
+        self.assertEqual(self.client.post(self.url).status_code, 201)
+        self.assertEqual(self.client.post(self.url).status_code, 200)
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.likes, 1)
+        self.assertEqual(list(self.track.user_like.all()), [self.user])
+
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.likes, 0)
+        self.assertFalse(self.track.user_like.exists())
+
+    def test_likes_invalidate_track_list(self):
+        list_url = reverse("track_list")
+        etag = self.client.get(list_url)["ETag"]
+        self.client.post(self.url)
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["likes"], 1)
+
+        etag = response["ETag"]
+        self.client.delete(self.url)
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["likes"], 0)
+
+    def test_unlike_drifted_counter(self):
+        self.track.user_like.add(self.user)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.likes, 0)
+
+    def test_private_track_cant_be_liked(self):
+        Track.objects.filter(pk=self.track.pk).update(private=True)
+        self.assertEqual(self.client.post(self.url).status_code, 404)
+
+    def test_reconcile_track_likes(self):
+        self.track.user_like.add(self.user)
+        other = self.user.tracks.create(title="other", license=self.license, likes=3)
+
+        call_command("reconcile_track_likes", stdout=io.StringIO())
+
+        self.track.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.track.likes, other.likes), (1, 0))
+
+
+class TrendingTest(APITestCase):
+    def setUp(self) -> None:
+        pause_counters_flusher(self)
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.genre = Genre.objects.create(name="Rock")
+        self.old_hit = self.user.tracks.create(title="old", license=self.license)
+        self.new_hit = self.user.tracks.create(title="new", license=self.license)
+        self.new_hit.genre.add(self.genre)
+        self.private = self.user.tracks.create(
+            title="private", license=self.license, private=True
+        )
+        self.now = timezone.now()
+
+    def play(self, track, count, hours_ago):
+        for _ in range(count):
+            play_buckets.add(track.pk, self.now - timedelta(hours=hours_ago))
+
+    def test_plays_are_bucketed(self):
+        moment = self.now.replace(hour=10, minute=30)
+        play_buckets.add(self.old_hit.pk, moment)
+        play_buckets.add(self.old_hit.pk, moment + timedelta(hours=1))
+        play_buckets.flush()
+        play_buckets.add(self.old_hit.pk, moment)
+        play_buckets.flush()
+
+        buckets = self.old_hit.plays.order_by("period", "start")
+        self.assertEqual(
+            [(bucket.period, bucket.start.hour, bucket.plays) for bucket in buckets],
+            [("hour", 10, 2), ("hour", 11, 1)],
+        )
+
+    def test_old_buckets_are_pruned(self):
+        self.play(self.old_hit, 1, hours_ago=24 * 8)
+        self.play(self.old_hit, 1, hours_ago=1)
+        play_buckets.flush()
+        TrackPlayBucket.objects.create(
+            track=self.old_hit, period="day", start=self.now - timedelta(days=8)
+        )
+        refresh_trending_charts(self.now)
+
+        self.assertEqual(list(self.old_hit.plays.values_list("plays", flat=True)), [1])
+
+    def test_trending_chart_decays_old_plays(self):
+        self.play(self.old_hit, 10, hours_ago=48)
+        self.play(self.new_hit, 3, hours_ago=1)
+        self.play(self.private, 20, hours_ago=1)
+        play_buckets.flush()
+        refresh_trending_charts(self.now)
+
+        response = self.client.get(reverse("trending"))
+        self.assertEqual(
+            [item["track"]["id"] for item in response.data],
+            [self.new_hit.pk, self.old_hit.pk],
+        )
+        self.assertEqual(response.data[0]["rank"], 1)
+
+        response = self.client.get(reverse("trending"), {"genre": self.genre.pk})
+        self.assertEqual(
+            [item["track"]["id"] for item in response.data], [self.new_hit.pk]
+        )
+
+    def test_hidden_tracks_leave_chart(self):
+        self.play(self.old_hit, 10, hours_ago=1)
+        self.play(self.new_hit, 3, hours_ago=1)
+        play_buckets.flush()
+        refresh_trending_charts(self.now)
+        soft_delete(self.old_hit)
+        Track.objects.filter(pk=self.new_hit.pk).update(private=True)
+
+        self.assertEqual(self.client.get(reverse("trending")).data, [])
+
+    def test_stream_url_records_play(self):
+        self.old_hit.file.name = "media/tracks/track.mp3"
+        self.old_hit.save()
+        self.client.get(reverse("stream_url", args=[self.old_hit.pk]))
+        self.assertEqual(len(play_buckets.take()), 1)
+
+
+class ListeningEventTest(APITestCase):
+    def setUp(self) -> None:
+        pause_counters_flusher(self)
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.track = self.user.tracks.create(
+            title="track", license=self.license, file="media/tracks/track.mp3"
+        )
+
+    def test_stream_url_records_event(self):
+        self.client.force_authenticate(self.user)
+        self.client.get(reverse("stream_url", args=[self.track.pk]))
+        listening_events.flush()
+
+        event = ListeningEvent.objects.get()
+        self.assertEqual(
+            (event.track_id, event.user_id, event.kind),
+            (self.track.pk, self.user.pk, ListeningEvent.PLAY),
+        )
+
+    def test_full_buffer_drops_oldest(self):
+        buffer = ListeningEventBuffer(size=2, batch_size=1)
+        for kind in ("play", "download", "play"):
+            buffer.record(self.track.pk, kind)
+        buffer.flush()
+
+        self.assertEqual(
+            list(ListeningEvent.objects.order_by("pk").values_list("kind", flat=True)),
+            ["download", "play"],
+        )
+
+    def test_failed_flush_keeps_order(self):
+        buffer = ListeningEventBuffer(size=10, batch_size=10)
+        buffer.record(self.track.pk, "play")
+        with mock.patch.object(buffer, "write", side_effect=RuntimeError):
+            buffer.flush()
+        buffer.record(self.track.pk, "download")
+
+        self.assertEqual([event.kind for event in buffer.take()], ["play", "download"])
+
+    def test_failed_flush_of_full_buffer_drops_oldest(self):
+        buffer = ListeningEventBuffer(size=2, batch_size=2)
+        buffer.record(self.track.pk, "play")
+
+        def record_meanwhile(batch):
+            for kind in ("download", "download"):
+                buffer.record(self.track.pk, kind)
+            raise RuntimeError
+
+        with mock.patch.object(buffer, "write", side_effect=record_meanwhile):
+            buffer.flush()
+
+        self.assertEqual(
+            [event.kind for event in buffer.take()], ["download", "download"]
+        )
+
+    @override_settings(LISTENING_EVENT_RETENTION_DAYS=7)
+    def test_compaction_rolls_old_events_into_days(self):
+        now = timezone.now()
+        for days_ago, kind in (
+            (10, "play"),
+            (10, "play"),
+            (9, "download"),
+            (1, "play"),
+        ):
+            ListeningEvent.objects.create(
+                track=self.track,
+                user=self.user,
+                kind=kind,
+                created_at=now - timedelta(days=days_ago),
+            )
+
+        self.assertEqual(compact_listening_events(now), 2)
+        self.assertEqual(ListeningEvent.objects.count(), 1)
+        self.assertEqual(
+            sorted(DailyListening.objects.values_list("kind", "count")),
+            [("download", 1), ("play", 2)],
+        )
+        self.assertEqual(compact_listening_events(now), 0)
+
+
+class FeedTest(APITestCase):
+    def setUp(self) -> None:
+        self.listener = User.objects.create_user(
+            email="listener@gmail.com", password="12345678test"
+        )
+        self.artist = User.objects.create_user(
+            email="artist@gmail.com", password="12345678test"
+        )
+        self.star = User.objects.create_user(
+            email="star@gmail.com", password="12345678test"
+        )
+        Follower.objects.create(user=self.artist, subscriber=self.listener)
+        Follower.objects.create(user=self.star, subscriber=self.listener)
+        self.client.force_authenticate(self.listener)
+
+    def publish(self, author, title, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return author.tracks.create(
+                title=title, license=author.licenses.create(text="text"), **kwargs
+            )
+
+    def get_feed_titles(self, **params):
+        response = self.client.get(reverse("feed"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [track["title"] for track in response.data["results"]]
+
+    def test_followers_are_counted(self):
+        self.artist.refresh_from_db()
+        self.assertEqual(self.artist.followers_count, 1)
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_light_artists_are_pushed_and_heavy_pulled(self):
+        Follower.objects.create(user=self.star, subscriber=self.artist)
+        self.publish(self.artist, "pushed")
+        self.publish(self.star, "pulled")
+        self.publish(self.artist, "private", private=True)
+
+        self.assertEqual(
+            list(FeedItem.objects.values_list("track__title", flat=True)), ["pushed"]
+        )
+        self.assertEqual(self.get_feed_titles(), ["pulled", "pushed"])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_delivery_is_kept_when_followers_change(self):
+        star_follower = Follower.objects.create(user=self.star, subscriber=self.artist)
+        self.publish(self.artist, "pushed")
+        self.publish(self.star, "pulled")
+        star_follower.delete()
+        Follower.objects.create(user=self.artist, subscriber=self.star)
+
+        self.assertEqual(self.get_feed_titles(), ["pulled", "pushed"])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_feed_pages_merge_by_cursor(self):
+        Follower.objects.create(user=self.star, subscriber=self.artist)
+        for index in range(3):
+            self.publish(self.artist, f"pushed {index}")
+            self.publish(self.star, f"pulled {index}")
+
+        with mock.patch.object(FeedPagination, "page_size", 4):
+            response = self.client.get(reverse("feed"))
+            cursor = parse_qs(urlsplit(response.data["next"]).query)["cursor"][0]
+            titles = [track["title"] for track in response.data["results"]]
+            titles += self.get_feed_titles(cursor=cursor)
+
+        self.assertEqual(
+            titles,
+            [f"{kind} {index}" for index in (2, 1, 0) for kind in ("pulled", "pushed")],
+        )
+
+    def test_track_turned_private_leaves_inboxes(self):
+        track = self.publish(self.artist, "track")
+        track.private = True
+        with self.captureOnCommitCallbacks(execute=True):
+            track.save()
+
+        self.assertFalse(FeedItem.objects.exists())
+        self.assertEqual(self.get_feed_titles(), [])
+
+    def test_unfollow_clears_inbox(self):
+        self.publish(self.artist, "track")
+        Follower.objects.get(user=self.artist).delete()
+
+        self.assertFalse(FeedItem.objects.exists())
+        self.artist.refresh_from_db()
+        self.assertEqual(self.artist.followers_count, 0)
+
+    def test_new_follower_gets_pushed_tracks(self):
+        self.publish(self.artist, "pushed")
+        Follower.objects.filter(user=self.artist).delete()
+        Follower.objects.create(user=self.artist, subscriber=self.listener)
+
+        self.assertEqual(self.get_feed_titles(), ["pushed"])
+
+    def test_followers_are_recounted(self):
+        User.objects.update(followers_count=0)
+        Follower.objects.get(user=self.star).delete()
+        call_command("reconcile_followers_count", stdout=io.StringIO())
+
+        self.artist.refresh_from_db()
+        self.assertEqual(self.artist.followers_count, 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follower.objects.create(user=self.artist, subscriber=self.listener)
+
+    def test_feed_requires_authentication(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse("feed"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SimilarTrackTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.a, self.b, self.c = (
+            self.user.tracks.create(title=title, license=self.license)
+            for title in "abc"
+        )
+        self.hidden = self.user.tracks.create(
+            title="hidden", license=self.license, private=True
+        )
+        first = self.user.playlists.create(title="first")
+        first.track.add(self.a, self.b, self.c, self.hidden)
+        self.user.playlists.create(title="second").track.add(self.a, self.b)
+        self.a.user_like.add(self.user)
+        self.c.user_like.add(self.user)
+
+    def get_similar(self, track):
+        response = self.client.get(reverse("similar_tracks", args=[track.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(item["track"]["title"], item["score"]) for item in response.data]
+
+    def test_neighbours_ranked_by_cosine_similarity(self):
+        build_similar_tracks()
+
+        similar = self.get_similar(self.a)
+        self.assertEqual([title for title, _ in similar], ["b", "c"])
+        self.assertAlmostEqual(similar[0][1], 2 / np.sqrt(6), places=5)
+        self.assertEqual(
+            [title for title, _ in self.get_similar(self.hidden)], ["b", "c", "a"]
+        )
+
+    @override_settings(SIMILAR_TRACKS_COUNT=1)
+    def test_only_top_neighbours_are_kept(self):
+        build_similar_tracks()
+        self.assertEqual([title for title, _ in self.get_similar(self.c)], ["a"])
+
+    def test_tracks_hidden_after_build_are_not_served(self):
+        build_similar_tracks()
+        self.b.private = True
+        self.b.save()
+        self.assertEqual([title for title, _ in self.get_similar(self.a)], ["c"])
+
+
+class ListCacheTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test"
+        )
+        self.other_user = User.objects.create_user(
+            email="other@gmail.com", password="12345678test"
+        )
+        self.license = self.user.licenses.create(text="text")
+        self.genre = Genre.objects.create(name="Rock")
+        self.track = self.user.tracks.create(title="title", license=self.license)
+        self.track.genre.add(self.genre)
+
+    def test_track_list_is_served_from_cache(self):
+        url = reverse("track_list")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"unknown": "x"})
+        self.assertEqual(response.data["results"][0]["title"], "title")
+
+        self.track.title = "new title"
+        self.track.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data["results"][0]["title"], "new title")
+
+        self.genre.name = "Jazz"
+        self.genre.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data["results"][0]["genre"][0]["name"], "Jazz")
+
+    def test_author_list_is_invalidated_per_author(self):
+        url = reverse("author_track_list", args=[self.user.pk])
+        self.client.get(url)
+
+        other_license = self.other_user.licenses.create(text="text")
+        self.other_user.tracks.create(title="other", license=other_license)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.user.username = "author"
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data["results"][0]["user"]["username"], "author")
+
+    def test_unlisted_changes_keep_global_list(self):
+        url = reverse("track_list")
+        self.client.get(url)
+        newcomer = User.objects.create_user(
+            email="new@gmail.com", password="12345678test"
+        )
+        newcomer.is_active = True
+        newcomer.save()
+        newcomer.licenses.create(text="text")
+        newcomer.username = "newcomer"
+        newcomer.save()
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=["last_login"])
+        self.user.is_active = True
+        self.user.save()
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.user.social_links.create(link="https://example.com")
+        response = self.client.get(url)
+        self.assertEqual(len(response.data["results"][0]["user"]["social_links"]), 1)
+
+
+class QueryBudgetTest(APITestCase):
+    def setUp(self) -> None:
+        self.genres = [Genre.objects.create(name=name) for name in ("Rock", "Pop")]
+        self.playlist_user = User.objects.create_user(
+            email="listener@gmail.com", password="12345678test"
+        )
+        self.playlist = self.playlist_user.playlists.create(title="playlist")
+        for number in range(5):
+            user = User.objects.create_user(
+                email=f"test{number}@gmail.com", password="12345678test"
+            )
+            user.social_links.create(link=f"https://test_link/{number}")
+            license = user.licenses.create(text="text")
+            album = user.albums.create(name=f"album{number}", description="text")
+            track = user.tracks.create(title="title", license=license, album=album)
+            track.genre.set(self.genres)
+            self.playlist.track.add(track)
+            track.track_comments.create(user=user, text="text")
+        self.user = user
+        self.track = track
+
+    def test_track_lists(self):
+        response = assert_query_budget(self, 5, reverse("track_list"))
+        self.assertEqual(response.data["count"], 5)
+        assert_query_budget(self, 5, reverse("author_track_list", args=[self.user.pk]))
+
+    def test_author_views(self):
+        self.client.force_authenticate(user=self.user)
+        assert_query_budget(self, 4, reverse("track-list"))
+
+        self.client.force_authenticate(user=self.playlist_user)
+        response = assert_query_budget(self, 5, reverse("playlist-list"))
+        self.assertEqual(len(response.data[0]["track"]), 5)
+
+    def test_comments(self):
+        assert_query_budget(self, 3, reverse("track_comments", args=[self.track.pk]))
 
 
 class AuthorTrackListAPIViewTest(APITestCase):
@@ -7,10 +7,21 @@ from audio_library.views import (
     AlbumAPIView,
     PublicAlbumAPIView,
     TrackAPIView,
+    UploadSessionAPIView,
     PlayListAPIView,
     TrackListAPIView,
     AuthorTrackListAPIView,
+    TrackSearchAPIView,
+    AutocompleteAPIView,
+    TrendingAPIView,
+    SimilarTrackAPIView,
+    FeedAPIView,
+    LikeTrackAPIView,
     StreamingTrackAPIView,
+    StreamUrlAPIView,
+    HLSManifestAPIView,
+    WaveformAPIView,
+    ThumbnailAPIView,
     DownloadTrackAPIView,
     CommentAuthorAPIView,
     CommentAPIView,
@@ -20,6 +31,7 @@ router = routers.DefaultRouter()
 router.register(r"license", LicenseAPIView, basename="license")
 router.register(r"album", AlbumAPIView, basename="album")
 router.register(r"track", TrackAPIView, basename="track")
+router.register(r"upload", UploadSessionAPIView, basename="upload")
 router.register(r"playlist", PlayListAPIView, basename="playlist")
 router.register(r"comment", CommentAuthorAPIView, basename="comment")
 
@@ -27,6 +39,18 @@ urlpatterns = [
     path(
         "stream_track/<int:pk>/", StreamingTrackAPIView.as_view(), name="stream_track"
     ),
+    path("like_track/<int:pk>/", LikeTrackAPIView.as_view(), name="like_track"),
+    path("stream_url/<int:pk>/", StreamUrlAPIView.as_view(), name="stream_url"),
+    path("hls_track/<int:pk>/", HLSManifestAPIView.as_view(), name="hls_track"),
+    path("track/<int:pk>/waveform/", WaveformAPIView.as_view(), name="track_waveform"),
+    path(
+        "track/<int:pk>/similar/", SimilarTrackAPIView.as_view(), name="similar_tracks"
+    ),
+    path(
+        "thumbnail/<int:size>/<path:name>",
+        ThumbnailAPIView.as_view(),
+        name="thumbnail",
+    ),
     path(
         "download_track/<int:pk>/",
         DownloadTrackAPIView.as_view(),
@@ -35,6 +59,10 @@ urlpatterns = [
     path("genre/", GenreAPIView.as_view(), name="genre"),
     path("author_albums/<int:pk>/", PublicAlbumAPIView.as_view(), name="author_albums"),
     path("track_list/", TrackListAPIView.as_view(), name="track_list"),
+    path("track_search/", TrackSearchAPIView.as_view(), name="track_search"),
+    path("autocomplete/", AutocompleteAPIView.as_view(), name="autocomplete"),
+    path("trending/", TrendingAPIView.as_view(), name="trending"),
+    path("feed/", FeedAPIView.as_view(), name="feed"),
     path(
         "author_track_list/<int:pk>/",
         AuthorTrackListAPIView.as_view(),
@@ -1,32 +1,116 @@
 import os
 
-from rest_framework import generics, viewsets, parsers, views, status
+from rest_framework import (
+    generics,
+    mixins,
+    permissions,
+    viewsets,
+    parsers,
+    views,
+    status,
+)
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Prefetch, Q
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.files.storage import default_storage
 from django.http import HttpResponse
-
-from audio_library.models import Genre, License, Album, Track, PlayList, Comment
+from django.utils.cache import patch_vary_headers, patch_cache_control
+from django.conf import settings
+
+from audio_library.models import (
+    Genre,
+    License,
+    Album,
+    Track,
+    PlayList,
+    Comment,
+    ListeningEvent,
+    SimilarTrack,
+    TrendingTrack,
+    UploadSession,
+)
 from audio_library.serializers import (
     GenreSerializer,
     LicenseSerializer,
     AlbumSerializer,
     CreateTrackSerializer,
     TrackSerializer,
+    TrendingTrackSerializer,
+    SimilarTrackSerializer,
     CreatePlayListSerializer,
     PlayListSerializer,
     CommentSerializer,
     CommentAuthorSerializer,
+    UploadSessionSerializer,
+    UploadTrackSerializer,
+)
+from audio_library.classes import (
+    CachedListMixin,
+    ConditionalListMixin,
+    FeedPagination,
+    KeysetPagination,
+    MixedSerializer,
+    Pagination,
+    SearchPagination,
+)
+from audio_library.services.counters import track_counters
+from audio_library.services.deletion import soft_delete
+from audio_library.services.feed import Feed
+from audio_library.services.play_sessions import (
+    create_play_session,
+    get_play_session,
+    is_play_session_active,
+    set_play_session,
+)
+from audio_library.services.autocomplete import autocomplete_index
+from audio_library.services.likes import like_track, unlike_track
+from audio_library.services.listening import listening_events
+from audio_library.services.search import SearchResults
+from audio_library.services.stream_urls import sign_stream_url
+from audio_library.services.streaming import media_file_response
+from audio_library.services.hls import get_hls_manifest_name, sign_hls_manifest
+from audio_library.services.list_cache import (
+    GENRES_SCOPE,
+    GLOBAL_SCOPE,
+    get_author_scope,
+    get_comments_scope,
+)
+from audio_library.services.processing import schedule_track_processing
+from audio_library.services.transcoding import CLIENT_HINTS, choose_rendition
+from audio_library.services.trending import play_buckets
+from audio_library.services.waveform import load_waveform
+from audio_library.services.uploads import (
+    ChunkOutOfRange,
+    ChunkSizeMismatch,
+    allocate_upload,
+    discard_upload,
+    get_missing_chunks,
+    get_upload_path,
+    open_upload,
+    write_chunk,
 )
-from audio_library.classes import MixedSerializer, Pagination
 from core.permissions import IsAuthor
-from core.services import delete_old_file
+from core.upload_handlers import validate_upload_file
+from core.storage import media_storage
+from core.thumbnails import choose_thumbnail_format, thumbnails
+
+
+def track_file_exists(track: Track) -> bool:
+    # A stored file size means the file was already read once, skip the stat
+    return bool(track.file) and (
+        track.file_size is not None or os.path.exists(track.file.path)
+    )
 
 
-class GenreAPIView(generics.ListAPIView):
+class GenreAPIView(ConditionalListMixin, generics.ListAPIView):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
 
+    def get_cache_scopes(self):
+        return [GENRES_SCOPE]
+
 
 class LicenseAPIView(viewsets.ModelViewSet):
     serializer_class = LicenseSerializer
@@ -51,13 +135,15 @@ class AlbumAPIView(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
     def perform_destroy(self, instance):
-        delete_old_file(instance.cover.path)
-        instance.delete()
+        soft_delete(instance)
 
 
-class PublicAlbumAPIView(generics.ListAPIView):
+class PublicAlbumAPIView(ConditionalListMixin, generics.ListAPIView):
     serializer_class = AlbumSerializer
 
+    def get_cache_scopes(self):
+        return [get_author_scope(self.kwargs.get("pk"))]
+
     def get_queryset(self):
         return Album.objects.filter(user__id=self.kwargs.get("pk"), private=False)
 
@@ -69,16 +155,106 @@ class TrackAPIView(MixedSerializer, viewsets.ModelViewSet):
     serializer_classes_by_action = {"list": TrackSerializer}
 
     def get_queryset(self):
-        return Track.objects.filter(user=self.request.user)
+        return Track.objects.filter(user=self.request.user).with_related()
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        track = serializer.save(user=self.request.user)
+        schedule_track_processing(track)
+
+    def perform_update(self, serializer):
+        if "file" in serializer.validated_data:
+            # Metadata of the old file until processing reads the new one
+            track = serializer.save(
+                renditions={},
+                duration=None,
+                bitrate=None,
+                sample_rate=None,
+                file_size=None,
+            )
+            schedule_track_processing(track)
+        else:
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        soft_delete(instance)
+
+
+class UploadSessionAPIView(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Resumable track upload: create a session, PUT raw chunks to
+    `chunk/<index>/` in any order, then POST the track fields to `finalize/`.
+    """
+
+    permission_classes = [IsAuthor]
+    serializer_class = UploadSessionSerializer
+
+    def get_queryset(self):
+        queryset = UploadSession.objects.filter(user=self.request.user)
+        if self.action == "finalize":
+            # A concurrent finalize waits for the lock, then finds no session
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def perform_create(self, serializer):
+        session = serializer.save(
+            user=self.request.user, chunk_size=settings.TRACK_UPLOAD_CHUNK_SIZE
+        )
+        allocate_upload(session)
 
     def perform_destroy(self, instance):
-        delete_old_file(instance.cover.path)
-        delete_old_file(instance.file.path)
+        discard_upload(instance)
         instance.delete()
 
+    @action(detail=True, methods=["put"], url_path=r"chunk/(?P<index>\d+)")
+    def chunk(self, request, pk=None, index=None):
+        session = self.get_object()
+        try:
+            write_chunk(session, int(index), request.stream)
+        except ChunkOutOfRange:
+            return Response(
+                {"chunk": "Such chunk doesn't exist"}, status=status.HTTP_404_NOT_FOUND
+            )
+        except ChunkSizeMismatch:
+            return Response(
+                {"chunk": "Chunk size doesn't match the session"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=["post"])
+    @transaction.atomic
+    def finalize(self, request, pk=None):
+        session = self.get_object()
+        missing = get_missing_chunks(session)
+        if missing:
+            return Response({"missing": missing}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            error = validate_upload_file(get_upload_path(session), session.file_name)
+        except FileNotFoundError:
+            return Response(
+                {"upload": "Such upload doesn't exist"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        if error:
+            return Response({"file": [error]}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = UploadTrackSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        with open_upload(session) as file:
+            track = serializer.save(user=request.user, file=file)
+        UploadSession.objects.filter(pk=session.pk).delete()
+        transaction.on_commit(lambda: discard_upload(session))
+        schedule_track_processing(track)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 
 class PlayListAPIView(MixedSerializer, viewsets.ModelViewSet):
     parser_classes = (parsers.MultiPartParser,)
@@ -87,45 +263,160 @@ class PlayListAPIView(MixedSerializer, viewsets.ModelViewSet):
     serializer_classes_by_action = {"list": PlayListSerializer}
 
     def get_queryset(self):
-        return PlayList.objects.filter(user=self.request.user)
+        return PlayList.objects.filter(user=self.request.user).prefetch_related(
+            Prefetch("track", queryset=Track.objects.with_related())
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
     def perform_destroy(self, instance):
-        delete_old_file(instance.cover.path)
-        instance.delete()
+        soft_delete(instance)
 
 
-class TrackListAPIView(generics.ListAPIView):
+class TrackListAPIView(ConditionalListMixin, CachedListMixin, generics.ListAPIView):
     queryset = Track.objects.filter(
         Q(album=None) | Q(album__private=False), private=False
-    )
+    ).with_related()
     serializer_class = TrackSerializer
     pagination_class = Pagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ["title", "user__username", "album__name", "genre__name"]
 
+    def get_cache_scopes(self):
+        return [GLOBAL_SCOPE]
+
 
-class AuthorTrackListAPIView(generics.ListAPIView):
+class AuthorTrackListAPIView(
+    ConditionalListMixin, CachedListMixin, generics.ListAPIView
+):
     serializer_class = TrackSerializer
     pagination_class = Pagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ["title", "album__name", "genre__name"]
 
+    def get_cache_scopes(self):
+        return [GENRES_SCOPE, get_author_scope(self.kwargs.get("pk"))]
+
     def get_queryset(self):
         return Track.objects.filter(
             Q(album=None) | Q(album__private=False),
             user__id=self.kwargs.get("pk"),
             private=False,
+        ).with_related()
+
+
+class TrackSearchAPIView(generics.ListAPIView):
+    serializer_class = TrackSerializer
+    pagination_class = SearchPagination
+    filter_backends = []
+
+    def get_queryset(self):
+        return SearchResults(self.request.query_params.get("q", ""))
+
+    def list(self, request, *args, **kwargs):
+        if not self.get_queryset().tokens:
+            return Response(
+                {"q": "Search query is required"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return super().list(request, *args, **kwargs)
+
+
+class FeedAPIView(generics.ListAPIView):
+    serializer_class = TrackSerializer
+    pagination_class = FeedPagination
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = []
+
+    def get_queryset(self):
+        return Feed(self.request.user)
+
+
+class TrendingAPIView(generics.ListAPIView):
+    serializer_class = TrendingTrackSerializer
+    filter_backends = []
+
+    def get_queryset(self):
+        genre = self.request.query_params.get("genre")
+        return (
+            TrendingTrack.objects.filter(
+                # Charts are rebuilt after new plays only, so may list tracks
+                # hidden since
+                Q(track__album=None) | Q(track__album__private=False),
+                genre_id=int(genre) if genre and genre.isdigit() else None,
+                track__private=False,
+                track__is_deleted=False,
+            )
+            .order_by("rank")
+            .prefetch_related(Prefetch("track", queryset=Track.objects.with_related()))
         )
 
 
-class StreamingTrackAPIView(views.APIView):
-    def add_audition(self):
-        self.track.auditions += 1
-        self.track.save()
+class SimilarTrackAPIView(generics.ListAPIView):
+    serializer_class = SimilarTrackSerializer
+    filter_backends = []
+
+    def get_queryset(self):
+        return (
+            SimilarTrack.objects.filter(
+                Q(similar__album=None) | Q(similar__album__private=False),
+                track_id=self.kwargs.get("pk"),
+                similar__private=False,
+                similar__is_deleted=False,
+            )
+            .order_by("rank")
+            .prefetch_related(
+                Prefetch("similar", queryset=Track.objects.with_related())
+            )
+        )
+
 
+class AutocompleteAPIView(views.APIView):
+    def get(self, request):
+        suggestions = autocomplete_index.search(request.query_params.get("q", ""))
+        return Response({"results": suggestions}, status=status.HTTP_200_OK)
+
+
+class LikeTrackAPIView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_track(self, pk):
+        return Track.objects.filter(
+            Q(album=None) | Q(album__private=False), pk=pk, private=False
+        ).first()
+
+    def post(self, request, pk):
+        track = self.get_track(pk)
+        if track is None:
+            return Response(
+                {"track": "Such track doesn't exist"}, status=status.HTTP_404_NOT_FOUND
+            )
+        created = like_track(track, request.user)
+        return Response(
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    def delete(self, request, pk):
+        track = self.get_track(pk)
+        if track is None:
+            return Response(
+                {"track": "Such track doesn't exist"}, status=status.HTTP_404_NOT_FOUND
+            )
+        unlike_track(track, request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def add_audition(request, response, track_pk: int) -> None:
+    """Count a play once per play session, starting one with `response`."""
+    if is_play_session_active(get_play_session(request), track_pk):
+        return
+    track_counters.increment(track_pk, "auditions")
+    play_buckets.add(track_pk)
+    listening_events.record(track_pk, ListeningEvent.PLAY, request)
+    set_play_session(request, response, create_play_session(track_pk))
+
+
+class StreamingTrackAPIView(views.APIView):
     def get(self, request, pk):
         try:
             self.track = Track.objects.get(pk=pk, private=False)
@@ -134,22 +425,142 @@ class StreamingTrackAPIView(views.APIView):
                 {"track": "Such track doesn't exist"}, status=status.HTTP_404_NOT_FOUND
             )
 
-        if self.track.file and os.path.exists(self.track.file.path):
-            self.add_audition()
-            response = HttpResponse('', content_type="audio/mpeg", status=206)
-            response['X-Accel-Redirect'] = f"/mp3/{self.track.file.name}"
-            return response
-        else:
+        response = None
+        if track_file_exists(self.track):
+            name = choose_rendition(request, self.track)
+            size = self.track.file_size if name == self.track.file.name else None
+            try:
+                response = media_file_response(request, name, "/mp3/", size=size)
+            except FileNotFoundError:
+                pass
+
+        if response is None:
             return Response(
                 {"track": "File with this track doesn't exist or removed"},
                 status=status.HTTP_404_NOT_FOUND,
             )
+        add_audition(request, response, self.track.pk)
+        response["Accept-CH"] = ", ".join(CLIENT_HINTS)
+        patch_vary_headers(response, CLIENT_HINTS)
+        return response
+
+
+class StreamUrlAPIView(views.APIView):
+    def get(self, request, pk):
+        try:
+            track = Track.objects.get(pk=pk, private=False)
+        except Track.DoesNotExist:
+            return Response(
+                {"track": "Such track doesn't exist"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        if not track.file:
+            return Response(
+                {"track": "File with this track doesn't exist or removed"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        url, expires = sign_stream_url(choose_rendition(request, track))
+        response = Response(
+            {"url": request.build_absolute_uri(url), "expires": expires},
+            status=status.HTTP_200_OK,
+        )
+        # nginx serves the signed URL, so the play is counted when it's issued
+        add_audition(request, response, track.pk)
+        return response
+
+
+class HLSManifestAPIView(views.APIView):
+    def get(self, request, pk):
+        try:
+            track = Track.objects.get(pk=pk, private=False)
+        except Track.DoesNotExist:
+            return Response(
+                {"track": "Such track doesn't exist"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            with default_storage.open(get_hls_manifest_name(track)) as manifest:
+                content = manifest.read()
+        except FileNotFoundError:
+            return Response(
+                {"track": "HLS stream for this track isn't ready yet"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return HttpResponse(
+            sign_hls_manifest(track, content),
+            content_type="application/vnd.apple.mpegurl",
+        )
+
+
+class WaveformAPIView(views.APIView):
+    def get(self, request, pk):
+        try:
+            resolution = int(
+                request.query_params.get(
+                    "resolution", max(settings.WAVEFORM_RESOLUTIONS)
+                )
+            )
+        except ValueError:
+            resolution = None
+        if resolution not in settings.WAVEFORM_RESOLUTIONS:
+            return Response(
+                {"resolution": f"Choose one of {settings.WAVEFORM_RESOLUTIONS}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            track = Track.objects.get(pk=pk, private=False)
+        except Track.DoesNotExist:
+            return Response(
+                {"track": "Such track doesn't exist"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            peaks = load_waveform(track, resolution)
+        except FileNotFoundError:
+            return Response(
+                {"track": "Waveform for this track isn't ready yet"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        response = Response(
+            {"resolution": resolution, "peaks": peaks.tolist()},
+            status=status.HTTP_200_OK,
+        )
+        patch_cache_control(response, max_age=60 * 60)
+        return response
+
+
+class ThumbnailAPIView(views.APIView):
+    def get(self, request, size, name):
+        if size not in settings.THUMBNAIL_SIZES:
+            return Response(
+                {"size": f"Choose one of {settings.THUMBNAIL_SIZES}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not (media_storage.is_blob_name(name) and name.endswith(".jpg")):
+            return Response(
+                {"image": "Such image doesn't exist"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            thumbnail_name = thumbnails.get(
+                name, size, choose_thumbnail_format(request)
+            )
+        except FileNotFoundError:
+            return Response(
+                {"image": "Such image doesn't exist"}, status=status.HTTP_404_NOT_FOUND
+            )
+        response = media_file_response(request, thumbnail_name, "/media/")
+        # Source names are content hashes, so a thumbnail URL never changes
+        patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60)
+        patch_vary_headers(response, ["Accept"])
+        return response
 
 
 class DownloadTrackAPIView(views.APIView):
     def add_download(self):
-        self.track.downloads += 1
-        self.track.save()
+        track_counters.increment(self.track.pk, "downloads")
+        listening_events.record(self.track.pk, ListeningEvent.DOWNLOAD, self.request)
 
     def get(self, request, pk):
         try:
@@ -159,24 +570,42 @@ class DownloadTrackAPIView(views.APIView):
                 {"track": "Such track doesn't exist"}, status=status.HTTP_404_NOT_FOUND
             )
 
-        if self.track.file and os.path.exists(self.track.file.path):
-            self.add_download()
-            response = HttpResponse('', content_type="audio/mpeg", status=206)
-            response["Content-Disposition"] = f"attachment; filename={self.track.file.name}"
-            response['X-Accel-Redirect'] = f"/media/{self.track.file.name}"
-            return response
-        else:
+        response = None
+        if track_file_exists(self.track):
+            try:
+                response = media_file_response(
+                    request,
+                    self.track.file.name,
+                    "/media/",
+                    attachment=True,
+                    size=self.track.file_size,
+                    file_name=self.track.file_name,
+                )
+            except FileNotFoundError:
+                pass
+
+        if response is None:
             return Response(
                 {"track": "File with this track doesn't exist or removed"},
                 status=status.HTTP_404_NOT_FOUND,
             )
+        self.add_download()
+        return response
 
 
-class CommentAPIView(generics.ListAPIView):
+class CommentAPIView(ConditionalListMixin, generics.ListAPIView):
     serializer_class = CommentSerializer
+    pagination_class = KeysetPagination
+
+    def get_cache_scopes(self):
+        return [get_comments_scope(self.kwargs.get("pk"))]
 
     def get_queryset(self):
-        return Comment.objects.filter(track__id=self.kwargs.get("pk"))
+        return (
+            Comment.objects.filter(track__id=self.kwargs.get("pk"))
+            .select_related("user")
+            .prefetch_related("user__social_links")
+        )
 
 
 class CommentAuthorAPIView(viewsets.ModelViewSet):
@@ -4,23 +4,43 @@ import os
 
 
 def get_path_upload_avatar(instance, file: str) -> str:
-    return os.path.join("media", "avatars", str(instance.pk), file)
+    return os.path.join("media", "avatars", file)
 
 
 def get_path_upload_album_cover(instance, file: str) -> str:
-    return os.path.join("media", "albums", str(instance.user.pk), file)
+    return os.path.join("media", "albums", file)
 
 
 def get_path_upload_track(instance, file: str) -> str:
-    return os.path.join("media", "tracks", str(instance.user.pk), file)
+    return os.path.join("media", "tracks", file)
+
+
+def get_path_track_media(instance) -> str:
+    """
+    Directory of the files made from the track's upload. It's named after the
+    content-hashed upload, so it can't be found from ids under /media/.
+    """
+    return os.path.join(os.path.splitext(instance.file.name)[0], str(instance.pk))
+
+
+def get_path_track_hls(instance) -> str:
+    return os.path.join(get_path_track_media(instance), "hls")
+
+
+def get_path_track_rendition(instance, quality: str) -> str:
+    return os.path.join(get_path_track_media(instance), "renditions", f"{quality}.mp3")
+
+
+def get_path_track_waveform(instance) -> str:
+    return os.path.join(get_path_track_media(instance), "waveform.peaks")
 
 
 def get_path_upload_playlist_cover(instance, file: str) -> str:
-    return os.path.join("media", "playlists", str(instance.user.pk), file)
+    return os.path.join("media", "playlists", file)
 
 
 def get_path_upload_track_cover(instance, file: str) -> str:
-    return os.path.join("media", "tracks", "covers", str(instance.user.pk), file)
+    return os.path.join("media", "tracks", "covers", file)
 
 
 def validate_size_image(file_obj):
@@ -28,8 +48,3 @@ def validate_size_image(file_obj):
         raise ValidationError(
             f"Your file shouldn't be more than {USER_IMAGE_SIZE_MB_LIMIT}MB"
         )
-
-
-def delete_old_file(path_file):
-    if os.path.exists(path_file):
-        os.remove(path_file)
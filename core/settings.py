@@ -119,7 +119,112 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Uploads are hashed and checked while streaming into a temp dir on the
+# media volume, so storing them is a rename. The dir has to exist before
+# the system checks run, a fresh checkout or media volume doesn't have it.
+FILE_UPLOAD_HANDLERS = ["core.upload_handlers.ValidatingUploadHandler"]
+FILE_UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, "uploads")
+os.makedirs(FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+
 USER_IMAGE_SIZE_MB_LIMIT = 2
+TRACK_SIZE_MB_LIMIT = int(os.environ.get("TRACK_SIZE_MB_LIMIT", 100))
+
+# A shared cache (Redis) is needed once there is more than one worker process
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("REDIS_URL"),
+    }
+    if os.environ.get("REDIS_URL")
+    else {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+# Seconds a cached list response is kept, invalidation doesn't depend on it
+LIST_CACHE_TIMEOUT = int(os.environ.get("LIST_CACHE_TIMEOUT", 24 * 60 * 60))
+
+# Trending charts: plays of the last TRENDING_WINDOW_HOURS, halved every
+# TRENDING_HALF_LIFE_HOURS, top TRENDING_CHART_SIZE overall and per genre
+TRENDING_WINDOW_HOURS = int(os.environ.get("TRENDING_WINDOW_HOURS", 72))
+TRENDING_HALF_LIFE_HOURS = float(os.environ.get("TRENDING_HALF_LIFE_HOURS", 12))
+TRENDING_CHART_SIZE = int(os.environ.get("TRENDING_CHART_SIZE", 50))
+TRENDING_REFRESH_INTERVAL = float(os.environ.get("TRENDING_REFRESH_INTERVAL", 60))
+
+# Listening events kept in memory until flushed (oldest dropped beyond that),
+# rows per INSERT, and days raw events are kept before daily compaction
+LISTENING_EVENT_BUFFER_SIZE = int(os.environ.get("LISTENING_EVENT_BUFFER_SIZE", 100000))
+LISTENING_EVENT_BATCH_SIZE = int(os.environ.get("LISTENING_EVENT_BATCH_SIZE", 1000))
+LISTENING_EVENT_RETENTION_DAYS = int(
+    os.environ.get("LISTENING_EVENT_RETENTION_DAYS", 30)
+)
+
+# New tracks of artists with more subscribers are merged into feeds on read
+# instead of being copied into every subscriber's inbox
+FEED_FANOUT_MAX_FOLLOWERS = int(os.environ.get("FEED_FANOUT_MAX_FOLLOWERS", 1000))
+# Latest pushed tracks of an artist copied into a new subscriber's inbox
+FEED_FOLLOW_BACKFILL = int(os.environ.get("FEED_FOLLOW_BACKFILL", 50))
+
+# Neighbours kept per track by build_similar_tracks
+SIMILAR_TRACKS_COUNT = int(os.environ.get("SIMILAR_TRACKS_COUNT", 20))
+
+# Seconds between incremental syncs and full rebuilds of the autocomplete index
+AUTOCOMPLETE_REFRESH_INTERVAL = float(
+    os.environ.get("AUTOCOMPLETE_REFRESH_INTERVAL", 5)
+)
+AUTOCOMPLETE_REBUILD_INTERVAL = float(
+    os.environ.get("AUTOCOMPLETE_REBUILD_INTERVAL", 15 * 60)
+)
+
+# Cover and avatar thumbnails, rendered on first request
+THUMBNAIL_SIZES = (64, 256, 512)
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_CACHE_MAX_SIZE_MB = int(os.environ.get("THUMBNAIL_CACHE_MAX_SIZE_MB", 512))
+
+# Orphaned media files purged per transaction by the background flusher
+FILE_DELETION_BATCH_SIZE = int(os.environ.get("FILE_DELETION_BATCH_SIZE", 100))
+
+# Bytes per chunk of a resumable track upload
+TRACK_UPLOAD_CHUNK_SIZE = int(
+    os.environ.get("TRACK_UPLOAD_CHUNK_SIZE", 5 * 1024 * 1024)
+)
+
+# Hours an unfinished upload is kept before expire_upload_sessions drops it
+UPLOAD_SESSION_TTL_HOURS = int(os.environ.get("UPLOAD_SESSION_TTL_HOURS", 24))
+
+# Seconds between batched writes of play/download counters, 0 writes through
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", 5))
+
+# Seconds flushed play/download counters may wait before cached track lists
+# are invalidated to show them
+TRACK_LIST_COUNTERS_MAX_AGE = float(os.environ.get("TRACK_LIST_COUNTERS_MAX_AGE", 60))
+
+# Seconds during which range requests of one listening session count as one play
+PLAY_SESSION_MAX_AGE = int(os.environ.get("PLAY_SESSION_MAX_AGE", 60 * 60))
+
+# Signed media links validated by nginx secure_link, see nginx/default.conf
+STREAM_URL_SECRET = os.environ.get("STREAM_URL_SECRET")
+STREAM_URL_TTL = int(os.environ.get("STREAM_URL_TTL", 60 * 60))
+STREAM_URL_PREFIX = "/secure/"
+
+# "x-accel" hands files to nginx, "native" serves byte ranges from the worker
+STREAMING_BACKEND = os.environ.get("STREAMING_BACKEND", "x-accel")
+
+# Post-upload processing of tracks, every processor gets the saved Track
+TRACK_PROCESSORS = [
+    "audio_library.services.metadata.extract_metadata",
+    "audio_library.services.waveform.extract_waveform",
+    "audio_library.services.hls.segment_track",
+    "audio_library.services.transcoding.transcode_track",
+]
+TRACK_PROCESSING_WORKERS = int(os.environ.get("TRACK_PROCESSING_WORKERS", 2))
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+HLS_SEGMENT_DURATION = 10
+
+# Lower bitrate mp3 renditions of every track, quality name -> kbps
+TRACK_RENDITIONS = {"low": 64, "medium": 128, "high": 192}
+TRANSCODING_WORKERS = int(os.environ.get("TRANSCODING_WORKERS", 2))
+
+# Waveform peaks are stored once at the highest resolution
+WAVEFORM_RESOLUTIONS = (256, 512, 1024, 2048, 4096)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -153,6 +258,11 @@ SPECTACULAR_SETTINGS = {
 
 REFRESH_TOKEN_SECRET = os.environ.get("REFRESH_TOKEN_SECRET")
 
+# Users authenticated by access token are kept in memory per worker,
+# by default for the 15 minutes an access token lives
+AUTH_USER_CACHE_SIZE = int(os.environ.get("AUTH_USER_CACHE_SIZE", 10000))
+AUTH_USER_CACHE_TIMEOUT = float(os.environ.get("AUTH_USER_CACHE_TIMEOUT", 15 * 60))
+
 SPOTIFY_CLIENT_ID = os.environ.get("SPOTIFY_CLIENT_ID")
 SPOTIFY_SECRET = os.environ.get("SPOTIFY_SECRET")
 
@@ -162,3 +272,5 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:8000",
     "http://127.0.0.1",
 ]
+
+CORS_EXPOSE_HEADERS = ["X-Play-Session"]
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import re
+import tempfile
+from collections import Counter
+
+from django.apps import apps
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+CONTENT_HASH_RE = re.compile(
+    r"(^|/)([0-9a-f]{2})/([0-9a-f]{2})/\2\3[0-9a-f]{60}(\.\w+)?$"
+)
+
+# Model fields whose files live in the content-addressed storage
+MEDIA_FILE_FIELDS = (
+    ("users", "User", "avatar"),
+    ("audio_library", "Album", "cover"),
+    ("audio_library", "Track", "cover"),
+    ("audio_library", "Track", "file"),
+    ("audio_library", "PlayList", "cover"),
+)
+
+
+def get_media_blob_model():
+    return apps.get_model("audio_library", "MediaBlob")
+
+
+def hash_file(content) -> str:
+    sha256 = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    content.seek(0)
+    return sha256.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every upload once under `<upload_to dir>/ab/cd/abcd...<ext>`, where
+    `abcd...` is the SHA-256 of its content. MediaBlob counts the references,
+    and the file is removed after the last reference is deleted.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def get_blob_name(self, name: str, content_hash: str) -> str:
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return "/".join(
+            part
+            for part in (
+                directory,
+                content_hash[:2],
+                content_hash[2:4],
+                f"{content_hash}{extension}",
+            )
+            if part
+        )
+
+    def is_blob_name(self, name: str) -> bool:
+        return bool(CONTENT_HASH_RE.search(name))
+
+    def write_hashed(self, directory: str, content):
+        """Copy `content` into a temporary file while hashing it."""
+        os.makedirs(self.path(directory), exist_ok=True)
+        sha256 = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.path(directory), suffix=".part")
+        with os.fdopen(fd, "wb") as temp_file:
+            content.seek(0)
+            for chunk in content.chunks():
+                sha256.update(chunk)
+                temp_file.write(chunk)
+        return temp_path, sha256.hexdigest()
+
+    def _save(self, name, content):
+        temp_path = None
+        content_hash = getattr(content, "content_hash", None)
+        if content_hash is None and hasattr(content, "temporary_file_path"):
+            content_hash = hash_file(content)
+        elif content_hash is None:
+            temp_path, content_hash = self.write_hashed(os.path.dirname(name), content)
+
+        blob_name = self.get_blob_name(name, content_hash)
+        full_path = self.path(blob_name)
+        MediaBlob = get_media_blob_model()
+        try:
+            with transaction.atomic():
+                blob, created = MediaBlob.objects.select_for_update().get_or_create(
+                    name=blob_name, defaults={"size": content.size}
+                )
+                if not created:
+                    MediaBlob.objects.filter(pk=blob.pk).update(
+                        ref_count=F("ref_count") + 1
+                    )
+                if created or not os.path.exists(full_path):
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    if temp_path is not None:
+                        os.replace(temp_path, full_path)
+                        temp_path = None
+                    else:
+                        file_move_safe(
+                            content.temporary_file_path(),
+                            full_path,
+                            allow_overwrite=True,
+                        )
+                    if self.file_permissions_mode is not None:
+                        os.chmod(full_path, self.file_permissions_mode)
+        finally:
+            if temp_path is not None:
+                os.remove(temp_path)
+        return blob_name
+
+    def delete(self, name):
+        MediaBlob = get_media_blob_model()
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                return super().delete(name)
+            if blob.ref_count > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(
+                    ref_count=F("ref_count") - 1
+                )
+                return
+            blob.delete()
+            transaction.on_commit(lambda: FileSystemStorage.delete(self, name))
+
+
+def get_media_file_fields():
+    for app_label, model_name, field_name in MEDIA_FILE_FIELDS:
+        yield apps.get_model(app_label, model_name), field_name
+
+
+def count_media_references() -> Counter:
+    # Files queued for deletion keep their reference until they are purged
+    references = Counter(
+        apps.get_model("audio_library", "FileDeletion")
+        .objects.values_list("name", flat=True)
+        .iterator()
+    )
+    for model, field_name in get_media_file_fields():
+        names = (
+            model._default_manager.exclude(**{f"{field_name}__isnull": True})
+            .exclude(**{field_name: ""})
+            .values_list(field_name, flat=True)
+        )
+        references.update(names.iterator())
+    return references
+
+
+def recount_media_blobs() -> None:
+    """Repair MediaBlob reference counts from the rows referencing files."""
+    references = count_media_references()
+    MediaBlob = get_media_blob_model()
+    for blob in MediaBlob.objects.iterator():
+        ref_count = references.get(blob.name, 0)
+        if ref_count:
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=ref_count)
+        else:
+            blob.delete()
+            FileSystemStorage.delete(media_storage, blob.name)
+
+
+media_storage = ContentAddressedStorage()
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.urls import reverse
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from core.storage import media_storage
+
+THUMBNAIL_DIR = "thumbnails"
+# Format name -> Pillow format, preferred first
+THUMBNAIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+
+
+def choose_thumbnail_format(request) -> str:
+    return "webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg"
+
+
+def get_thumbnail_name(name: str, size: int, image_format: str) -> str:
+    key = hashlib.sha256(name.encode()).hexdigest()
+    return f"{THUMBNAIL_DIR}/{key[:2]}/{key}_{size}.{image_format}"
+
+
+def render_thumbnail(source: str, destination: str, size: int, image_format: str):
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(destination))
+        with os.fdopen(fd, "wb") as temp_file:
+            image.save(
+                temp_file,
+                THUMBNAIL_FORMATS[image_format],
+                quality=settings.THUMBNAIL_QUALITY,
+            )
+        os.replace(temp_path, destination)
+
+
+class ThumbnailCache:
+    """
+    Thumbnails rendered on first request and kept on disk. Hits refresh the
+    file's mtime, and once the cache grows past `max_size` bytes the least
+    recently used thumbnails are evicted down to 90% of it.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._size = None
+
+    def get(self, name: str, size: int, image_format: str) -> str:
+        """Return the thumbnail name, FileNotFoundError for a missing source."""
+        thumbnail_name = get_thumbnail_name(name, size, image_format)
+        path = media_storage.path(thumbnail_name)
+        try:
+            os.utime(path)
+            return thumbnail_name
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        render_thumbnail(media_storage.path(name), path, size, image_format)
+        self.add(os.path.getsize(path))
+        return thumbnail_name
+
+    def scan(self) -> list:
+        entries = []
+        for root, _, files in os.walk(media_storage.path(THUMBNAIL_DIR)):
+            for file in files:
+                try:
+                    stat = os.stat(os.path.join(root, file))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, file)))
+        return entries
+
+    def add(self, file_size: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self.scan())
+            else:
+                self._size += file_size
+            if self._size > self.max_size:
+                self._size = self.evict()
+
+    def evict(self) -> int:
+        # Other workers share the directory, so start from what is on disk
+        entries = sorted(self.scan())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+
+class ThumbnailsField(serializers.ReadOnlyField):
+    """URLs of the image thumbnails, one per THUMBNAIL_SIZES entry."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get("request")
+        urls = {}
+        for size in settings.THUMBNAIL_SIZES:
+            url = reverse("thumbnail", args=[size, value.name])
+            urls[str(size)] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+thumbnails = ThumbnailCache(settings.THUMBNAIL_CACHE_MAX_SIZE_MB * 1024 * 1024)
@@ -0,0 +1,111 @@
+import hashlib
+import os
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from rest_framework import serializers
+
+# Extension -> (size limit setting in MB, checks of the first bytes)
+UPLOAD_RULES = {
+    ".mp3": (
+        "TRACK_SIZE_MB_LIMIT",
+        (
+            lambda header: header.startswith(b"ID3"),
+            lambda header: header[:1] == b"\xff" and header[1:2] >= b"\xe0",
+        ),
+    ),
+    ".wav": (
+        "TRACK_SIZE_MB_LIMIT",
+        (lambda header: header[:4] == b"RIFF" and header[8:12] == b"WAVE",),
+    ),
+    ".jpg": (
+        "USER_IMAGE_SIZE_MB_LIMIT",
+        (lambda header: header[:3] == b"\xff\xd8\xff",),
+    ),
+}
+HEADER_SIZE = 12
+CONTENT_MISMATCH_MESSAGE = "File content doesn't match its extension"
+
+
+def get_upload_rules(file_name: str) -> Tuple[Optional[int], Optional[tuple]]:
+    """Size limit in bytes and header checks for the file's extension."""
+    size_limit, checks = UPLOAD_RULES.get(
+        os.path.splitext(file_name)[1].lower(), (None, None)
+    )
+    return size_limit and getattr(settings, size_limit) * 1024 * 1024, checks
+
+
+def get_size_limit_message(size_limit: int) -> str:
+    return f"Your file shouldn't be more than {size_limit // (1024 * 1024)}MB"
+
+
+def validate_upload_file(path: str, file_name: str) -> Optional[str]:
+    """
+    Run the checks ValidatingUploadHandler does while streaming over a file
+    that is already on disk, returns the reason it's rejected if it is.
+    """
+    size_limit, checks = get_upload_rules(file_name)
+    if size_limit and os.path.getsize(path) > size_limit:
+        return get_size_limit_message(size_limit)
+    if checks is not None:
+        with open(path, "rb") as file:
+            header = file.read(HEADER_SIZE)
+        if not any(check(header) for check in checks):
+            return CONTENT_MISMATCH_MESSAGE
+    return None
+
+
+class ValidatingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams uploads to FILE_UPLOAD_TEMP_DIR while hashing them, checking their
+    magic bytes and size. A bad file is skipped as soon as it is detected and
+    the reason is kept in `request.upload_errors` for the serializer.
+    """
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.size_limit, self.checks = get_upload_rules(file_name)
+        self.header = b""
+        self.sha256 = hashlib.sha256()
+
+    def reject(self, message):
+        upload_errors = getattr(self.request, "upload_errors", {})
+        upload_errors[self.field_name] = [message]
+        self.request.upload_errors = upload_errors
+        self.file.close()
+        raise SkipFile
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.checks is not None and len(self.header) < HEADER_SIZE:
+            self.header += raw_data[: HEADER_SIZE - len(self.header)]
+            if len(self.header) == HEADER_SIZE:
+                self.check_header()
+        if self.size_limit and start + len(raw_data) > self.size_limit:
+            self.reject(get_size_limit_message(self.size_limit))
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def check_header(self):
+        if not any(check(self.header) for check in self.checks):
+            self.reject(CONTENT_MISMATCH_MESSAGE)
+        self.checks = None
+
+    def file_complete(self, file_size):
+        if self.checks is not None:
+            self.check_header()
+        file = super().file_complete(file_size)
+        file.content_hash = self.sha256.hexdigest()
+        return file
+
+
+class UploadErrorsMixin:
+    """Reports files rejected by ValidatingUploadHandler as field errors."""
+
+    def to_internal_value(self, data):
+        request = self.context.get("request")
+        upload_errors = getattr(request, "upload_errors", None)
+        if upload_errors:
+            raise serializers.ValidationError(upload_errors)
+        return super().to_internal_value(data)
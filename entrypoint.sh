@@ -1,4 +1,5 @@
 #!/bin/bash
 python manage.py makemigrations --noinput
 python manage.py migrate --noinput
+python manage.py reconcile_followers_count
 gunicorn core.wsgi:application --bind 0.0.0.0:8000
@@ -0,0 +1,4 @@
+def worker_exit(server, worker):
+    from audio_library.services.counters import flusher
+
+    flusher.stop()
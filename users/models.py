@@ -6,6 +6,7 @@ from django.contrib.auth.models import (
 )
 from django.core.validators import FileExtensionValidator
 from core.services import get_path_upload_avatar, validate_size_image
+from core.storage import media_storage
 
 
 class CustomUserManager(BaseUserManager):
@@ -38,6 +39,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     city = models.CharField(max_length=30, blank=True, null=True)
     about = models.TextField(max_length=2000, blank=True, null=True)
     avatar = models.ImageField(
+        storage=media_storage,
         upload_to=get_path_upload_avatar,
         blank=True,
         null=True,
@@ -53,6 +55,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
+    followers_count = models.PositiveIntegerField(default=0)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
@@ -69,6 +72,13 @@ class Follower(models.Model):
         User, on_delete=models.CASCADE, related_name="subscribers"
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "subscriber"], name="unique_follower"
+            )
+        ]
+
     def __str__(self):
         return f"{self.subscriber} subscribed to {self.user}"
 
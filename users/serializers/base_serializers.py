@@ -1,11 +1,22 @@
 from rest_framework import serializers
+from core.thumbnails import ThumbnailsField
+from core.upload_handlers import UploadErrorsMixin
 from users.models import User, SocialLink
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(UploadErrorsMixin, serializers.ModelSerializer):
+    avatar_thumbnails = ThumbnailsField(source="avatar")
+
     class Meta:
         model = User
-        fields = ("avatar", "username", "country", "city", "about")
+        fields = (
+            "avatar",
+            "avatar_thumbnails",
+            "username",
+            "country",
+            "city",
+            "about",
+        )
 
 
 class SocialLinkSerializer(serializers.ModelSerializer):
@@ -16,12 +27,14 @@ class SocialLinkSerializer(serializers.ModelSerializer):
 
 class AuthorSerializer(serializers.ModelSerializer):
     social_links = SocialLinkSerializer(many=True)
+    avatar_thumbnails = ThumbnailsField(source="avatar")
 
     class Meta:
         model = User
         fields = (
             "id",
             "avatar",
+            "avatar_thumbnails",
             "username",
             "country",
             "city",
@@ -1,13 +1,62 @@
 from rest_framework import authentication, exceptions
 from django.contrib.auth import get_user_model
 from django.conf import settings
+import copy
 import jwt
+import threading
+import time
+from collections import OrderedDict
 from typing import Optional
 from drf_spectacular.extensions import OpenApiAuthenticationExtension
 
 User = get_user_model()
 
 
+class UserCache:
+    """
+    Per-process LRU of authenticated users, each kept for at most `timeout`
+    seconds. Saving or deleting a user drops it (see users.signals), changes
+    made with QuerySet.update() are picked up once the entry expires.
+    """
+
+    def __init__(self, max_size: int, timeout: float):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    def get(self, pk: int):
+        with self._lock:
+            entry = self._users.get(pk)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires <= time.monotonic():
+                del self._users[pk]
+                return None
+            self._users.move_to_end(pk)
+        # Requests may change their user, they mustn't see each other's changes
+        return copy.copy(user)
+
+    def set(self, user) -> None:
+        with self._lock:
+            self._users[user.pk] = (copy.copy(user), time.monotonic() + self.timeout)
+            self._users.move_to_end(user.pk)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    def invalidate(self, pk: int) -> None:
+        with self._lock:
+            self._users.pop(pk, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TIMEOUT)
+
+
 class CustomBackendAuthentication(authentication.BaseAuthentication):
     def authenticate(self, request) -> Optional[tuple]:
         authorization_header = authentication.get_authorization_header(request).split()
@@ -38,9 +87,12 @@ class CustomBackendAuthentication(authentication.BaseAuthentication):
                 "Invalid authentication. Couldn't decode token"
             )
 
-        user = User.objects.filter(id=payload["user_id"]).first()
+        user = user_cache.get(payload["user_id"])
         if user is None:
-            raise exceptions.AuthenticationFailed("User not found")
+            user = User.objects.filter(id=payload["user_id"]).first()
+            if user is None:
+                raise exceptions.AuthenticationFailed("User not found")
+            user_cache.set(user)
         if not user.is_active:
             raise exceptions.AuthenticationFailed("User is inactive")
 
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import User
+from users.services.auth_backend import user_cache
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    pk = instance.pk
+    user_cache.invalidate(pk)
+    # Another request may cache the old row again until the change commits
+    transaction.on_commit(lambda: user_cache.invalidate(pk))
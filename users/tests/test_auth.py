@@ -4,9 +4,16 @@ from rest_framework import status
 from django.contrib.auth import get_user_model
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
+from django.test import RequestFactory
+from rest_framework import exceptions
 from unittest import mock
 import jwt
-from users.tokens import account_token_generator
+from users.services.auth_backend import (
+    CustomBackendAuthentication,
+    UserCache,
+    user_cache,
+)
+from users.tokens import account_token_generator, generate_access_token
 
 User = get_user_model()
 
@@ -284,6 +291,56 @@ class ResetPasswordApiViewTest(APITestCase):
         self.assertFalse(response.data["success"])
 
 
+class CustomBackendAuthenticationTest(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            email="test@gmail.com", password="12345678test", is_active=True
+        )
+        self.request = RequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Token {generate_access_token(self.user)}"
+        )
+        self.addCleanup(user_cache.clear)
+
+    def authenticate(self):
+        return CustomBackendAuthentication().authenticate(self.request)
+
+    def test_cached_user_needs_no_queries(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+
+        self.assertEqual(user, self.user)
+        self.assertIsNot(user, self.authenticate()[0])
+
+    def test_saved_user_is_reloaded(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaisesMessage(exceptions.AuthenticationFailed, "inactive"):
+            self.authenticate()
+
+    def test_deleted_user_is_rejected(self):
+        self.authenticate()
+        self.user.delete()
+
+        with self.assertRaisesMessage(exceptions.AuthenticationFailed, "not found"):
+            self.authenticate()
+
+    @mock.patch("users.services.auth_backend.time.monotonic")
+    def test_cache_expires_and_evicts(self, mock_monotonic):
+        other = User.objects.create_user(email="other@gmail.com", password="12345678")
+        cache = UserCache(max_size=1, timeout=10)
+        mock_monotonic.return_value = 0
+        cache.set(self.user)
+        self.assertEqual(cache.get(self.user.pk), self.user)
+
+        cache.set(other)
+        self.assertIsNone(cache.get(self.user.pk))
+        mock_monotonic.return_value = 10
+        self.assertIsNone(cache.get(other.pk))
+
+
 class SpotifyAuthAPIViewTest(APITestCase):
     def setUp(self) -> None:
         self.user = User.objects.create_user(